@@ -0,0 +1,70 @@
+import array
+import os
+import random
+import sys
+
+from mmgui import App, BrowserWindow, Table
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""
+Compares transferring a float64 column to JS as JSON (`tolist()` -> JSON -> `JSON.parse`)
+with the columnar path (`Table` -> one blob -> `Float64Array`), at 1e5, 1e6 and 1e7 elements.
+
+Usage:
+    python benchmarks/columnar/app.py
+
+The page calls both functions for every size, measures the roundtrip until the values are usable
+in JS, reports back to python and the app exits.
+"""
+
+app = App(headless=False)
+win = None
+_columns = {}
+
+
+def _column(size):
+    if size not in _columns:
+        if numpy is not None:
+            _columns[size] = numpy.random.default_rng(0).random(size)
+        else:
+            _columns[size] = array.array("d", (random.random() for _ in range(size)))
+    return _columns[size]
+
+
+def as_json(size):
+    return _column(size).tolist()
+
+
+def as_table(size):
+    return Table(value=_column(size))
+
+
+def report(results):
+    print("%-10s %10s %12s %12s %8s" % ("size", "path", "seconds", "MB/s", "speedup"))
+    for item in results:
+        json_seconds = next(r["seconds"] for r in results if r["size"] == item["size"] and r["path"] == "json")
+        print("%-10d %10s %12.3f %12.1f %7.1fx" % (item["size"], item["path"], item["seconds"],
+                                                   item["size"] * 8 / 1e6 / item["seconds"], json_seconds / item["seconds"]))
+    app.exit()
+
+
+def on_create(ctx):
+    global win
+    win = BrowserWindow({
+        "title": "Columnar benchmark - mmgui",
+        "width": 800,
+        "height": 600,
+    })
+    win.webview.bind_function("as_json", as_json)
+    win.webview.bind_function("as_table", as_table)
+    win.webview.bind_function("report", report)
+    win.webview.load_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.html"))
+    win.show()
+
+
+app.on("create", on_create)
+sys.exit(app.run())
@@ -0,0 +1,58 @@
+import timeit
+
+from mmgui.rpc import DispatchTable
+
+"""
+Per-call dispatch overhead of bound functions.
+
+Usage:
+    python benchmarks/dispatch_benchmark.py
+
+baseline: the old dispatch, a dict lookup and fn(**params) without any validation
+by name:  DispatchTable lookup by name, params validated against the signature
+by id:    DispatchTable lookup by "#<id>"
+coerce:   by name, params converted to the annotated types
+"""
+
+
+def query(table: str, limit: int = 100, offset: int = 0, desc: bool = False):
+    return None
+
+
+def main():
+    number = 200000
+    params = {"table": "users", "limit": 10, "offset": 20}
+    function_map = {"query": query}
+    dispatch_table = DispatchTable()
+    entry = dispatch_table.bind("query", query)
+    function_id = "#%d" % entry.id
+    coerce_table = DispatchTable()
+    coerce_table.bind("query", query, coerce=True)
+
+    def baseline():
+        if "query" in function_map:
+            function_map["query"](**params)
+
+    def by_name():
+        entry = dispatch_table.get("query")
+        args, kwargs = entry.bind(params)
+        entry.function(*args, **kwargs)
+
+    def by_id():
+        entry = dispatch_table.get(function_id)
+        args, kwargs = entry.bind(params)
+        entry.function(*args, **kwargs)
+
+    def coerce():
+        entry = coerce_table.get("query")
+        args, kwargs = entry.bind(params)
+        entry.function(*args, **kwargs)
+
+    print("%-10s %12s" % ("dispatch", "ns/call"))
+    for name, func in [("baseline", baseline), ("by name", by_name), ("by id", by_id), ("coerce", coerce)]:
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        print("%-10s %12.0f" % (name, seconds / number * 1e9))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import sys
+
+from mmgui import App, BrowserWindow
+
+"""
+Compares the drop target lookup of DragAndDropHelper on a page with a large DOM (~25k nodes):
+the former walk of the whole tree calling getBoundingClientRect() on every node, with the
+`document.elementsFromPoint` lookup filtered by the registered drop targets.
+
+Usage:
+    python benchmarks/drop_hit_test/app.py
+
+The page dispatches drops at random points with both lookups, reports back to python and the app exits.
+"""
+
+app = App(headless=False)
+win = None
+
+
+def report(results):
+    print("%-8s %-16s %10s %10s %10s" % ("nodes", "lookup", "avg ms", "p99 ms", "speedup"))
+    walk_avg = next(r["avg_ms"] for r in results if r["lookup"] == "walk")
+    for item in results:
+        print("%-8d %-16s %10.3f %10.3f %9.1fx" % (item["nodes"], item["lookup"], item["avg_ms"], item["p99_ms"], walk_avg / item["avg_ms"]))
+    app.exit()
+
+
+def on_create(ctx):
+    global win
+    win = BrowserWindow({
+        "title": "Drop hit test benchmark - mmgui",
+        "width": 1024,
+        "height": 768,
+    })
+    win.webview.bind_function("report", report)
+    win.webview.load_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.html"))
+    win.show()
+
+
+app.on("create", on_create)
+sys.exit(app.run())
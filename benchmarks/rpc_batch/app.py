@@ -0,0 +1,45 @@
+import os
+import sys
+
+from mmgui import App, BrowserWindow
+
+"""
+Measures JS -> Python RPC throughput with and without batching.
+
+Usage:
+    python benchmarks/rpc_batch/app.py
+
+The page fires bursts of `RPC.invoke` calls (like a dashboard render pass) in
+every batch mode, reports calls/sec back to python and the app exits.
+"""
+
+app = App(headless=False)
+win = None
+
+
+def noop(i):
+    return i
+
+
+def report(results):
+    print("%-10s %10s %12s %10s" % ("mode", "calls", "seconds", "calls/sec"))
+    for item in results:
+        print("%-10s %10d %12.3f %10.0f" % (item["mode"], item["calls"], item["seconds"], item["calls"] / item["seconds"]))
+    app.exit()
+
+
+def on_create(ctx):
+    global win
+    win = BrowserWindow({
+        "title": "RPC batch benchmark - mmgui",
+        "width": 800,
+        "height": 600,
+    })
+    win.webview.bind_function("noop", noop)
+    win.webview.bind_function("report", report)
+    win.webview.load_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.html"))
+    win.show()
+
+
+app.on("create", on_create)
+sys.exit(app.run())
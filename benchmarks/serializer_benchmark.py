@@ -0,0 +1,78 @@
+import datetime
+import decimal
+import random
+import timeit
+from dataclasses import dataclass
+
+from mmgui.serializer import SERIALIZERS
+
+"""
+Compares the bridge serializers on realistic payload shapes.
+
+Usage:
+    python benchmarks/serializer_benchmark.py
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@dataclass
+class Order(object):
+    id: int
+    customer: str
+    amount: decimal.Decimal
+    created_at: datetime.datetime
+    tags: list
+
+
+def make_payloads():
+    rnd = random.Random(42)
+    now = datetime.datetime(2020, 1, 1, 12, 0, 0)
+    payloads = {
+        "small_reply": {"callback_id": "1", "result": {"ok": True, "msg": "hello", "count": 3}},
+        "rows_10k": {"callback_id": "2", "result": [
+            {"id": i, "name": "user_%d" % i, "score": rnd.random(), "active": i % 2 == 0, "tags": ["a", "b"]}
+            for i in range(10000)
+        ]},
+        "nested_config": {"callback_id": "3", "result": {
+            "section_%d" % i: {"key_%d" % j: {"value": j, "enabled": True, "items": list(range(10))} for j in range(20)}
+            for i in range(50)
+        }},
+        "floats_100k": {"callback_id": "4", "result": [rnd.random() for _ in range(100000)]},
+        "orders_5k": {"callback_id": "5", "result": [
+            Order(i, "customer_%d" % i, decimal.Decimal("%d.%02d" % (i, i % 100)), now + datetime.timedelta(minutes=i), ["x"])
+            for i in range(5000)
+        ]},
+    }
+    if numpy is not None:
+        payloads["numpy_100k"] = {"callback_id": "6", "result": numpy.random.rand(100000)}
+    return payloads
+
+
+def bench(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1000
+
+
+def main():
+    serializers = []
+    for name, serializer_class in SERIALIZERS.items():
+        try:
+            serializers.append(serializer_class())
+        except Exception as e:
+            print("skip %s: %s" % (name, e))
+
+    print("%-14s %-8s %12s %12s %12s" % ("payload", "backend", "dumps(ms)", "loads(ms)", "size(KB)"))
+    for payload_name, payload in make_payloads().items():
+        for serializer in serializers:
+            text = serializer.dumps(payload)
+            number = 5 if len(text) > 100000 else 1000
+            dumps_ms = bench(lambda: serializer.dumps(payload), number)
+            loads_ms = bench(lambda: serializer.loads(text), number)
+            print("%-14s %-8s %12.3f %12.3f %12.1f" % (payload_name, serializer.name, dumps_ms, loads_ms, len(text) / 1024))
+
+
+if __name__ == "__main__":
+    main()
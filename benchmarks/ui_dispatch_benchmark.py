@@ -0,0 +1,75 @@
+import threading
+import time
+
+from PyQt5.QtCore import QCoreApplication, QObject, pyqtSignal
+
+from mmgui.asyncqt import UIThreadLoop
+
+"""
+Throughput of calls posted from worker threads to the UI thread.
+
+Usage:
+    python benchmarks/ui_dispatch_benchmark.py
+
+signal:  the old UIThreadLoop, one queued signal emission (and Qt event) per call
+batched: UIThreadLoop, a deque drained in batches after a single wake-up
+"""
+
+
+class SignalLoop(QObject):
+    _msg_signal = pyqtSignal(tuple)
+
+    def __init__(self):
+        super(SignalLoop, self).__init__()
+        self._msg_signal.connect(self._on_msg)
+
+    def _on_msg(self, async_function):
+        func, args, kwargs = async_function
+        func(*args, **kwargs)
+
+    def run_on_ui_thread(self, func, *args, **kwargs):
+        self._msg_signal.emit((func, args, kwargs))
+
+
+def measure(app, loop, threads, posts):
+    done = threading.Event()
+    remaining = [threads * posts]
+
+    def on_ui(i):
+        remaining[0] -= 1 # only the UI thread writes it
+        if remaining[0] == 0:
+            done.set()
+            app.quit()
+
+    def producer():
+        for i in range(posts):
+            loop.run_on_ui_thread(on_ui, i)
+
+    workers = [threading.Thread(target=producer) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    app.exec_()
+    seconds = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+    assert done.is_set()
+    return threads * posts / seconds
+
+
+def main():
+    app = QCoreApplication([])
+    batched = UIThreadLoop()
+    batched.start_loop()
+    print("%-8s %8s %8s %14s" % ("loop", "threads", "posts", "calls/s"))
+    for threads in (1, 4):
+        posts = 200000 // threads
+        for name, loop in [("signal", SignalLoop()), ("batched", batched)]:
+            print("%-8s %8d %8d %14.0f" % (name, threads, posts, measure(app, loop, threads, posts)))
+    stats = batched.get_stats()
+    print("batched: %d drains, max depth %d, drain latency p50 %.2f ms, p99 %.2f ms" % (
+        stats["drains"], stats["max_depth"], stats["drain_latency_ms"]["p50"], stats["drain_latency_ms"]["p99"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import time
+
+from mmgui import App, BrowserWindow
+
+app = App(headless=False)
+win = None
+
+
+def query(count):
+    # a generator is streamed to js chunk by chunk, it pauses while the page is busy
+    for i in range(0, count, 1000):
+        time.sleep(0.05) # a slow database cursor
+        yield [{"id": j, "name": "row %d" % j} for j in range(i, min(i + 1000, count))]
+
+
+async def ticker(count):
+    for i in range(count):
+        await asyncio.sleep(0.1)
+        yield i
+
+
+def on_create(ctx):
+    global win
+    win = BrowserWindow({
+        "title": "Demo - mmgui",
+        "width": 1200,
+        "height": 800,
+        "dev_mode": True,
+    })
+    win.webview.bind_function("query", query)
+    win.webview.bind_function("ticker", ticker)
+    win.webview.load_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.html"))
+    win.show()
+
+app.on("create", on_create)
+app.run()
@@ -2,6 +2,12 @@
 from .app import Context, App
 from .webview import BrowserWindow, WebView
 from .menu import Menu, MenuSeparator
-from .asyncqt import run_on_worker_thread, run_on_ui_thread
+from .asyncqt import run_on_worker_thread, run_on_ui_thread, run_on_ui_thread_debounced, run_on_ui_thread_throttled, \
+    run_on_serial_queue, run_coroutine, to_worker, to_ui, gather, TaskFuture, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND
+from .rpc import current_call, RPCError, CancelledError
+from .blob import Blob
+from .cache import ResultCache
+from .columnar import Table
+from .store import Store
 
 __version__ = "0.0.8"
\ No newline at end of file
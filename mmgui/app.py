@@ -1,3 +1,4 @@
+import asyncio
 import sys
 # import signal
 
@@ -8,7 +9,8 @@ from PyQt5.QtCore import QCoreApplication, QSettings
 from PyQt5.QtWidgets import QApplication, QSplashScreen
 
 from .platform import setup_stdio, setup_console, run_as_job, STDOUT_STREAMS, STDERR_STREAMS
-from .asyncqt import asyncqt_ui_thread_loop
+from .blob import register_blob_scheme
+from .asyncqt import asyncqt_ui_thread_loop, asyncqt_event_loop, asyncqt_process_executor, asyncqt_worker_thread_executor, QtEventLoop
 
 
 class Context(object):
@@ -26,8 +28,17 @@ class App(Context):
                  configs_file = None,
                  log_file = None,
                  log_encode = None,
-                 debug = True
+                 debug = True,
+                 worker_pool: dict = None,
+                 use_asyncio: bool = False
                  ):
+        """
+        :param worker_pool: worker thread pool options, e.g. {"max_threads": 64, "min_threads": 8, "adaptive": True},
+                            see WorkerThreadExecutor.configure()
+        :param use_asyncio: drive an asyncio event loop from the Qt event loop of the UI thread, "create"/"destroy"
+                            callbacks and bound coroutine functions then run on it, use `await to_worker(fn)`
+                            for blocking work
+        """
         self._headless = headless
         self._configs_file = configs_file
         self._icon_file = icon_file
@@ -36,6 +47,10 @@ class App(Context):
         self._debug = debug
         self._log_file = log_file
         self._log_encode = log_encode
+        self._worker_pool = worker_pool
+        self._use_asyncio = use_asyncio
+        self._loop = None # QtEventLoop with use_asyncio
+        self._destroy_tasks = []
         self._settings : QSettings = None
         self._qt_application = None
         self._events_callback = {
@@ -48,17 +63,24 @@ class App(Context):
             raise Exception("unsupported event %s" % event)
         self._events_callback[event].append(callback)
 
-    def _notify_callback(self, event: str) -> NoReturn:
+    def _notify_callback(self, event: str) -> list:
         if event not in self._events_callback:
             raise Exception("unsupported event %s" % event)
+        tasks = []
         for callback in self._events_callback[event]:
-            callback(self)
+            result = callback(self)
+            if asyncio.iscoroutine(result):
+                if self._loop is None:
+                    result.close()
+                    raise Exception("async %s callback %s needs App(use_asyncio=True)" % (event, callback))
+                tasks.append(self._loop.create_task(result))
+        return tasks
 
     def on_create(self) -> NoReturn:
         self._notify_callback("create")
 
     def on_destroy(self) -> NoReturn:
-        self._notify_callback("destroy")
+        self._destroy_tasks = self._notify_callback("destroy") # awaited before the asyncio loop is closed
 
     def run(self) -> int:
         setup_stdio()
@@ -73,6 +95,7 @@ class App(Context):
                 import signal
                 signal.signal(signal.SIGINT, lambda *a: self._qt_application.quit())
         else:
+            register_blob_scheme() # custom schemes must be registered before the QApplication is created
             self._qt_application = QApplication(argv)
 
             # icon
@@ -90,6 +113,12 @@ class App(Context):
 
         # asyncqt
         asyncqt_ui_thread_loop.start_loop()
+        if self._worker_pool:
+            asyncqt_worker_thread_executor.configure(**self._worker_pool)
+        if self._use_asyncio:
+            self._loop = QtEventLoop()
+            asyncqt_event_loop.use_loop(self._loop)
+            self._loop.start()
 
         # configs
         if self._configs_file:
@@ -120,6 +149,9 @@ class App(Context):
         self._qt_application.aboutToQuit.connect(self._on_quit)
         self.on_create() # -> create and show the WebView window
         exit_code = self._qt_application.exec_()
+        if self._loop is not None:
+            self._loop.finish(self._destroy_tasks)
+            self._loop = None
         self._qt_application.deleteLater()
         return exit_code
         #sys.exit(exit_code)
@@ -139,6 +171,15 @@ class App(Context):
 
     def _on_quit(self):
         self.on_destroy()
+        asyncqt_event_loop.stop()
+        asyncqt_process_executor.shutdown()
+
+    def get_worker_stats(self) -> dict:
+        return asyncqt_worker_thread_executor.get_stats()
+
+    def get_ui_stats(self) -> dict:
+        """ depth and drain latency of the queue of calls posted to the UI thread """
+        return asyncqt_ui_thread_loop.get_stats()
 
     def exit(self) -> NoReturn:
         self._qt_application.quit()
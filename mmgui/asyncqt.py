@@ -1,8 +1,20 @@
+import asyncio
+import inspect
 import logging
+import multiprocessing
+import os
+import selectors
+import sys
+import threading
+import time
 import traceback
+from collections import deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
 from functools import wraps
 
-from PyQt5.QtCore import QObject, pyqtSignal, QThreadPool, QRunnable, pyqtSlot
+from PyQt5.QtCore import Qt, QObject, pyqtSignal, QThreadPool, QRunnable, pyqtSlot, QSocketNotifier, QTimer
+
+from .metrics import Histogram
 
 """
 asyncqt USAGE:
@@ -24,30 +36,131 @@ class DemoController(object):
     @run_on_ui_thread
     def _refresh_ui(self, data):
         logging.info("_refresh_ui data: " + str(data))
+
+    @run_on_worker_thread(priority=PRIORITY_BACKGROUND) # does not delay what the user is waiting on
+    def _rebuild_index(self):
+        ...
+
+    def on_export_btn_click(self):
+        # fan out on the pool, fan in on the UI thread
+        futures = [self._render_page(page) for page in range(10)]
+        gather(*futures).add_done_callback(self._on_export_done, on_ui_thread=True)
+
+    def _on_export_done(self, future):
+        pages = future.result() # raises the exception of the first failed page
+
+    @run_on_ui_thread_throttled(30) # workers may call it 500 times per second, the view refreshes 30 times
+    def _refresh_progress(self, progress):
+        ...
+
+    @run_on_ui_thread(coalesce_key=lambda self, row_id, data: (id(self), row_id)) # the latest update of every row
+    def _refresh_row(self, row_id, data):
+        ...
+
+    @run_on_serial_queue(key=lambda self, doc_id, text: doc_id) # edits of a document never race, no lock needed
+    def _save_document(self, doc_id, text):
+        ...
+
+# with App(use_asyncio=True) coroutines run on the UI thread and can hop
+async def on_refresh(self):
+    data = await to_worker(load_data, 1)   # blocking work
+    await to_ui(self._refresh_ui, data)    # a no-op hop on the UI thread, needed from other loops
 ------------------------------------------------------
 """
 
+PRIORITY_INTERACTIVE = "interactive" # js calls, the user is waiting on them
+PRIORITY_NORMAL = "normal"
+PRIORITY_BACKGROUND = "background"   # bulk jobs
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND) # most urgent first
+
 
 class UIThreadLoop(QObject):
-    _msg_signal = pyqtSignal(tuple)
+    """
+    Calls posted from worker threads are appended to a deque and drained in batches on the UI thread:
+    one queued Qt event wakes up the loop for a whole batch. A drain stops after `time_budget_ms` and
+    lets Qt handle input and paint events before it goes on with the rest.
+    """
+    _wake_signal = pyqtSignal()
+
+    def __init__(self, time_budget_ms: float = 8):
+        super(UIThreadLoop, self).__init__()
+        self._started = False
+        self._thread_id = threading.get_ident() # the thread this QObject lives in, the UI thread
+        self.time_budget_ms = time_budget_ms
+        self._queue = deque() # (posted_at, func, args, kwargs), append and popleft are atomic
+        self._wake_pending = False # a wake-up is posted and not drained yet
+        self._max_depth = 0
+        self._stats = {
+            "drained": 0,
+            "drains": 0,
+            "over_budget": 0 # drains which left calls for the next one
+        }
+        self._drain_latency = Histogram() # post -> call of the oldest call of every drain
+        self._drain_time = Histogram()    # duration of a drain
 
     def start_loop(self):
-        self._msg_signal.connect(self._on_msg)
+        if self._started:
+            return
+        self._started = True
+        self._wake_signal.connect(self._drain, Qt.QueuedConnection)
+        if self._queue: # posted before the loop was started
+            self._wake()
 
-    def _on_msg(self, async_function):
-        #logging.info("[UIThreadLoop] on msg, async_function=%s" % str(async_function))
-        func = async_function[0]
-        args = async_function[1]
-        kwargs = async_function[2]
-        func(*args, **kwargs)
+    def _wake(self):
+        self._wake_pending = True
+        self._wake_signal.emit()
 
-    def _send_msg(self, async_function):
-        #logging.info("[UIThreadLoop] send msg %s" % str(async_function))
-        self._msg_signal.emit(async_function)
+    def _drain(self):
+        self._wake_pending = False # cleared before draining, a call posted meanwhile is drained now or wakes us again
+        queue = self._queue
+        if not queue:
+            return
+        started = time.perf_counter()
+        self._drain_latency.observe((started - queue[0][0]) * 1000)
+        deadline = started + self.time_budget_ms / 1000
+        depth = len(queue)
+        if depth > self._max_depth:
+            self._max_depth = depth
+        count = 0
+        while queue:
+            _, func, args, kwargs = queue.popleft()
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                traceback.print_exc()
+                logging.exception(e)
+            count += 1
+            if count & 15 == 0 and queue and time.perf_counter() >= deadline: # the clock is read every 16 calls
+                self._stats["over_budget"] += 1
+                if not self._wake_pending:
+                    self._wake() # queued behind the input and paint events
+                break
+        self._stats["drained"] += count
+        self._stats["drains"] += 1
+        self._drain_time.observe((time.perf_counter() - started) * 1000)
 
     def run_on_ui_thread(self, func, *args, **kwargs):
-        async_function = (func, args, kwargs)
-        self._send_msg(async_function)
+        if self._started and threading.get_ident() == self._thread_id: # already there, called right away like before
+            func(*args, **kwargs)
+            return
+        self.post(func, *args, **kwargs)
+
+    def post(self, func, *args, **kwargs):
+        """ Queued even on the UI thread, func runs in a later drain. """
+        self._queue.append((time.perf_counter(), func, args, kwargs))
+        if not self._wake_pending and self._started:
+            self._wake()
+
+    def get_stats(self) -> dict:
+        """ queue depth, drained calls, drain latency (post -> call) and drain duration (ms percentiles) """
+        return {
+            **self._stats,
+            "depth": len(self._queue),
+            "max_depth": self._max_depth,
+            "time_budget_ms": self.time_budget_ms,
+            "drain_latency_ms": self._drain_latency.get_stats(),
+            "drain_time_ms": self._drain_time.get_stats()
+        }
 
 
 class WorkerRunnable(QRunnable):
@@ -69,32 +182,653 @@ class WorkerRunnable(QRunnable):
 
 
 class WorkerThreadExecutor(object):
+    """
+    Tasks are queued in priority lanes, a free thread always takes the most urgent one. To protect lower lanes
+    from starvation a task is promoted one lane for every `aging_interval` seconds it has waited.
 
-    _thread_pool = QThreadPool()
+    With `adaptive` the pool starts with `min_threads` threads and grows towards `max_threads` while tasks wait
+    longer than `target_wait_ms` in the queue, it shrinks back when threads are idle.
+    """
 
-    def __init__(self):
-        self._thread_pool.setMaxThreadCount(20)
-        self._thread_pool.setExpiryTimeout(30 * 1000) # default: 30seconds
+    def __init__(self, max_threads: int = 20, min_threads: int = None, expiry_timeout: float = 30,
+                 adaptive: bool = False, target_wait_ms: float = 50, aging_interval: float = 1.0):
+        self._thread_pool = QThreadPool()
+        self._aging_interval = aging_interval
+        self._lanes = {priority: deque() for priority in PRIORITIES} # (queued_at, func, args, kwargs)
+        self._lane_stats = {priority: {"submitted": 0, "completed": 0, "wait_total": 0.0, "wait_max": 0.0} for priority in PRIORITIES}
+        self._lock = threading.Lock()
+        self._queue_wait = Histogram()
+        self._run_time = Histogram()
+        self._recent_wait_ms = 0.0 # moving average, drives the adaptive pool size
+        self._adapted_at = time.monotonic()
+        self.configure(max_threads, min_threads, expiry_timeout, adaptive, target_wait_ms)
+
+    def configure(self, max_threads: int = 20, min_threads: int = None, expiry_timeout: float = 30,
+                  adaptive: bool = False, target_wait_ms: float = 50):
+        """
+        :param max_threads: upper bound of the pool size
+        :param min_threads: lower bound of an adaptive pool, defaults to the cpu count
+        :param expiry_timeout: seconds an idle thread is kept alive
+        """
+        if max_threads <= 0:
+            raise Exception("invalid max_threads %s" % max_threads)
+        self._max_threads = max_threads
+        self._min_threads = max(1, min(min_threads or os.cpu_count() or 1, max_threads))
+        self._adaptive = adaptive
+        self._target_wait_ms = target_wait_ms
+        self._thread_pool.setMaxThreadCount(self._min_threads if adaptive else max_threads)
+        self._thread_pool.setExpiryTimeout(int(expiry_timeout * 1000))
 
     def execute(self, func, *args, **kwargs):
-        runnable = WorkerRunnable(func, *args, **kwargs)
-        self._thread_pool.start(runnable)
+        self.execute_with_priority(PRIORITY_NORMAL, func, *args, **kwargs)
+
+    def execute_with_priority(self, priority, func, *args, **kwargs):
+        if priority not in self._lanes:
+            raise Exception("unknown priority %s" % priority)
+        with self._lock:
+            self._lanes[priority].append((time.monotonic(), func, args, kwargs))
+            self._lane_stats[priority]["submitted"] += 1
+        if self._adaptive:
+            self._adapt(time.monotonic())
+        self._thread_pool.start(WorkerRunnable(self._run_next)) # one runnable per task, it runs whichever task is most urgent by then
+
+    def _take_next(self):
+        now = time.monotonic()
+        with self._lock:
+            best_priority, best_rank = None, None
+            for rank, priority in enumerate(PRIORITIES):
+                lane = self._lanes[priority]
+                if lane:
+                    rank -= (now - lane[0][0]) / self._aging_interval
+                    if best_rank is None or rank < best_rank:
+                        best_priority, best_rank = priority, rank
+            if best_priority is None:
+                return None
+            queued_at, func, args, kwargs = self._lanes[best_priority].popleft()
+            stats = self._lane_stats[best_priority]
+            stats["wait_total"] += now - queued_at
+            stats["wait_max"] = max(stats["wait_max"], now - queued_at)
+            self._recent_wait_ms = self._recent_wait_ms * 0.8 + (now - queued_at) * 1000 * 0.2
+        self._queue_wait.observe((now - queued_at) * 1000)
+        if self._adaptive:
+            self._adapt(now)
+        return best_priority, func, args, kwargs
+
+    def _adapt(self, now):
+        with self._lock:
+            if now - self._adapted_at < 0.5:
+                return
+            self._adapted_at = now
+            queued = sum(len(lane) for lane in self._lanes.values())
+            oldest_wait_ms = max([(now - lane[0][0]) * 1000 for lane in self._lanes.values() if lane], default=0.0)
+            recent_wait_ms = max(self._recent_wait_ms, oldest_wait_ms) # threads may all be busy with long tasks
+        size = self._thread_pool.maxThreadCount()
+        if recent_wait_ms > self._target_wait_ms and queued and size < self._max_threads:
+            self._thread_pool.setMaxThreadCount(min(self._max_threads, size + max(1, size // 4)))
+        elif recent_wait_ms < self._target_wait_ms / 4 and self._thread_pool.activeThreadCount() < size // 2 \
+                and size > self._min_threads:
+            self._thread_pool.setMaxThreadCount(size - 1)
+
+    def _run_next(self):
+        task = self._take_next()
+        if task is None:
+            return
+        priority, func, args, kwargs = task
+        started_at = time.monotonic()
+        try:
+            func(*args, **kwargs)
+        finally:
+            self._run_time.observe((time.monotonic() - started_at) * 1000)
+            with self._lock:
+                self._lane_stats[priority]["completed"] += 1
+
+    def get_lane_stats(self) -> dict:
+        """ queued tasks, submitted/completed counts and wait times (ms) of each priority lane """
+        now = time.monotonic()
+        lane_stats = {}
+        with self._lock:
+            for priority in PRIORITIES:
+                lane, stats = self._lanes[priority], self._lane_stats[priority]
+                started = stats["submitted"] - len(lane)
+                lane_stats[priority] = {
+                    "queued": len(lane),
+                    "submitted": stats["submitted"],
+                    "completed": stats["completed"],
+                    "avg_wait_ms": stats["wait_total"] * 1000 / started if started else 0.0,
+                    "max_wait_ms": stats["wait_max"] * 1000,
+                    "oldest_wait_ms": (now - lane[0][0]) * 1000 if lane else 0.0
+                }
+        return lane_stats
+
+    def get_stats(self) -> dict:
+        """ pool size, active threads, queued tasks, queue wait and task run time (ms percentiles) """
+        lanes = self.get_lane_stats()
+        return {
+            "max_threads": self._thread_pool.maxThreadCount(),
+            "active_threads": self._thread_pool.activeThreadCount(),
+            "queued": sum(lane["queued"] for lane in lanes.values()),
+            "queue_wait_ms": self._queue_wait.get_stats(),
+            "run_time_ms": self._run_time.get_stats(),
+            "lanes": lanes
+        }
+
+
+EXECUTOR_UI = "ui"              # the Qt main thread
+EXECUTOR_THREAD = "thread"      # the shared worker thread pool
+EXECUTOR_PROCESS = "process"    # the managed process pool, for CPU-bound functions
+EXECUTORS = (EXECUTOR_UI, EXECUTOR_THREAD, EXECUTOR_PROCESS)
+
+
+class KeyedSerialExecutor(object):
+    """
+    Serial lanes on the worker thread pool: tasks with the same key run one at a time in order, tasks with
+    different keys run in parallel. A lane owning a resource (a sqlite connection, a serial port, a document)
+    replaces the lock around it. A lane only exists while it has tasks.
+    """
+
+    def __init__(self, worker_thread_executor, priority=PRIORITY_NORMAL):
+        self._worker_thread_executor = worker_thread_executor
+        self._priority = priority
+        self._lanes = {} # key -> deque of (priority, func, args, kwargs), the head is running or about to
+        self._lock = threading.Lock()
+
+    def execute(self, key, func, *args, **kwargs):
+        self.execute_with_priority(self._priority, key, func, *args, **kwargs)
+
+    def execute_with_priority(self, priority, key, func, *args, **kwargs):
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is not None:
+                lane.append((priority, func, args, kwargs))
+                return
+            self._lanes[key] = deque([(priority, func, args, kwargs)])
+        self._worker_thread_executor.execute_with_priority(priority, self._run_next, key)
+
+    def _run_next(self, key):
+        with self._lock:
+            _, func, args, kwargs = self._lanes[key][0]
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            logging.exception(e)
+        finally: # no return in here, it would swallow a BaseException of the task
+            with self._lock:
+                lane = self._lanes[key]
+                lane.popleft()
+                priority = lane[0][0] if lane else None
+                if not lane:
+                    del self._lanes[key]
+            if priority is not None: # one task per hop, a lane does not hog a pool thread
+                self._worker_thread_executor.execute_with_priority(priority, self._run_next, key)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "lanes": len(self._lanes),
+                "queued": sum(len(lane) for lane in self._lanes.values())
+            }
+
+
+class SerialExecutor(object):
+    """ A single named lane, tasks run one at a time in order. """
+
+    def __init__(self, name, worker_thread_executor, priority=PRIORITY_NORMAL):
+        self.name = name
+        self._lanes = KeyedSerialExecutor(worker_thread_executor, priority)
+
+    def execute(self, func, *args, **kwargs):
+        self._lanes.execute(self.name, func, *args, **kwargs)
+
+
+class ProcessExecutor(object):
+    """
+    Lazily started process pool, functions and their params must be picklable.
+    Workers are spawned, never forked: a fork of the Qt process would copy its threads' locks in whatever state they are.
+    """
+
+    def __init__(self, max_workers=None):
+        self._max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._max_workers, mp_context=multiprocessing.get_context("spawn"))
+            pool = self._pool
+        return pool.submit(func, *args, **kwargs)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+class _NotifyingSelector(selectors.BaseSelector):
+    """ Watches the fds of the asyncio loop with QSocketNotifiers, so that the Qt event loop wakes it up on IO. """
+
+    def __init__(self, on_event):
+        self._selector = selectors.SelectSelector() if sys.platform == "win32" else selectors.DefaultSelector()
+        self._on_event = on_event
+        self._notifiers = {} # fd -> [read notifier, write notifier]
+        self.blocking = False # select() never blocks while Qt drives the loop
+
+    def register(self, fileobj, events, data=None):
+        key = self._selector.register(fileobj, events, data)
+        self._notifiers[key.fd] = [None, None]
+        self._update_notifiers(key.fd, events)
+        return key
+
+    def unregister(self, fileobj):
+        key = self._selector.unregister(fileobj)
+        self._update_notifiers(key.fd, 0)
+        del self._notifiers[key.fd]
+        return key
+
+    def modify(self, fileobj, events, data=None):
+        key = self._selector.modify(fileobj, events, data)
+        self._update_notifiers(key.fd, events)
+        return key
+
+    def _update_notifiers(self, fd, events):
+        notifiers = self._notifiers[fd]
+        for index, (event, notifier_type) in enumerate(((selectors.EVENT_READ, QSocketNotifier.Read), (selectors.EVENT_WRITE, QSocketNotifier.Write))):
+            if events & event and notifiers[index] is None:
+                notifier = QSocketNotifier(fd, notifier_type)
+                notifier.activated.connect(lambda *args: self._on_event())
+                notifiers[index] = notifier
+            elif not events & event and notifiers[index] is not None:
+                notifiers[index].setEnabled(False)
+                notifiers[index].deleteLater()
+                notifiers[index] = None
+
+    def select(self, timeout=None):
+        return self._selector.select(timeout if self.blocking else 0)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        for fd in list(self._notifiers):
+            self._update_notifiers(fd, 0)
+        self._notifiers.clear()
+        self._selector.close()
+
+
+class QtEventLoop(asyncio.SelectorEventLoop):
+    """
+    asyncio event loop driven by the Qt event loop of the UI thread (App(use_asyncio=True)): it runs one
+    iteration whenever callbacks are ready, a timer is due or a watched fd is ready, and never blocks Qt.
+    """
+
+    def __init__(self):
+        super(QtEventLoop, self).__init__(_NotifyingSelector(self._wake_up))
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._run_iteration)
+        self._driven = False
+        self._old_asyncgen_hooks = None
+
+    def start(self):
+        """ Attach to the Qt event loop of the current (UI) thread, QApplication.exec_() then runs both. """
+        self._check_closed()
+        self._driven = True
+        self._thread_id = threading.get_ident()
+        self._old_asyncgen_hooks = sys.get_asyncgen_hooks() # restored by finish()
+        sys.set_asyncgen_hooks(firstiter=self._asyncgen_firstiter_hook, finalizer=self._asyncgen_finalizer_hook)
+        asyncio.events._set_running_loop(self)
+        asyncio.set_event_loop(self)
+        self._wake_up()
+
+    def finish(self, wait_for=()):
+        """ Detach from Qt once exec_() returned: wait for `wait_for`, cancel the other tasks and close the loop. """
+        self._driven = False
+        self._timer.stop()
+        asyncio.events._set_running_loop(None)
+        self._thread_id = None
+        self._selector.blocking = True # run_until_complete() drives the loop from now on
+        try:
+            if wait_for:
+                self.run_until_complete(asyncio.gather(*wait_for, return_exceptions=True))
+            tasks = [task for task in asyncio.all_tasks(self) if not task.done()]
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.run_until_complete(self.shutdown_asyncgens())
+        finally:
+            if self._old_asyncgen_hooks is not None:
+                sys.set_asyncgen_hooks(*self._old_asyncgen_hooks)
+                self._old_asyncgen_hooks = None
+            self.close()
+
+    def call_soon(self, callback, *args, **kwargs):
+        handle = super(QtEventLoop, self).call_soon(callback, *args, **kwargs)
+        self._wake_up() # only call_soon_threadsafe wakes up the selector
+        return handle
+
+    def call_at(self, when, callback, *args, **kwargs):
+        handle = super(QtEventLoop, self).call_at(when, callback, *args, **kwargs)
+        if self._driven and self._thread_id == threading.get_ident():
+            self._schedule_iteration()
+        return handle
+
+    def _wake_up(self):
+        if self._driven and not self._closed and self._thread_id == threading.get_ident():
+            self._timer.start(0)
+
+    def _run_iteration(self):
+        if not self._driven or self._closed:
+            return
+        self._run_once()
+        self._schedule_iteration()
+
+    def _schedule_iteration(self):
+        if self._ready:
+            self._timer.start(0)
+        elif self._scheduled: # the earliest timer, fds wake us up through their notifiers
+            delay_ms = max(0, int((self._scheduled[0].when() - self.time()) * 1000) + 1)
+            if not self._timer.isActive() or self._timer.remainingTime() > delay_ms:
+                self._timer.start(delay_ms)
+
+
+class AsyncioEventLoop(object):
+    """
+    Shared asyncio event loop for coroutines, it runs on its own daemon thread and is started on first use,
+    or the QtEventLoop of the UI thread with App(use_asyncio=True).
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._external = False # a loop driven by someone else, e.g. QtEventLoop
+        self._lock = threading.Lock()
+
+    def use_loop(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            if self._loop is not None:
+                raise Exception("the asyncio event loop is already running")
+            self._loop = loop
+            self._external = True
+
+    def is_loop_thread(self) -> bool:
+        """ True on the thread of a running loop, waiting on a coroutine there would deadlock. """
+        loop = self._loop
+        return loop is not None and getattr(loop, "_thread_id", None) == threading.get_ident()
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run_loop, name="asyncqt-asyncio-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def run_coroutine(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+
+    def stop(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+            external, self._external = self._external, False
+        if loop is not None and not external: # its owner finishes an external loop
+            loop.call_soon_threadsafe(loop.stop)
 
 
 asyncqt_ui_thread_loop = UIThreadLoop()
 asyncqt_worker_thread_executor = WorkerThreadExecutor()
+asyncqt_event_loop = AsyncioEventLoop()
+asyncqt_process_executor = ProcessExecutor()
+asyncqt_keyed_serial_executor = KeyedSerialExecutor(asyncqt_worker_thread_executor)
+
+
+class TaskFuture(Future):
+    """ concurrent.futures.Future of a task run by @run_on_worker_thread or @run_on_ui_thread. """
+
+    def add_done_callback(self, fn, on_ui_thread=False):
+        """ fn(future) is called on the thread completing the future, or on the UI thread with `on_ui_thread`. """
+        if on_ui_thread:
+            return super(TaskFuture, self).add_done_callback(lambda future: asyncqt_ui_thread_loop.run_on_ui_thread(fn, future))
+        return super(TaskFuture, self).add_done_callback(fn)
+
+    def then(self, fn, on_ui_thread=False) -> "TaskFuture":
+        """ Future of fn(result), the exception or cancellation of this future is passed through without calling fn. """
+        chained = TaskFuture()
+
+        def on_done(future):
+            if future.cancelled():
+                chained.cancel()
+            elif future.exception() is not None:
+                if chained.set_running_or_notify_cancel():
+                    chained.set_exception(future.exception())
+            else:
+                _run_into_future(chained, fn, (future.result(),), {})
+
+        self.add_done_callback(on_done, on_ui_thread)
+        return chained
+
+
+def gather(*futures, return_exceptions=False) -> TaskFuture:
+    """
+    Future of the list of results of `futures`, in order. It fails as soon as one of them fails,
+    unless `return_exceptions` puts the exceptions in the list instead.
+    """
+    gathered = TaskFuture()
+    gathered.set_running_or_notify_cancel()
+    results = [None] * len(futures)
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(index, future):
+        if future.cancelled():
+            error = CancelledError()
+        else:
+            error = future.exception()
+        with lock:
+            if gathered.done():
+                return
+            if error is not None and not return_exceptions:
+                gathered.set_exception(error)
+                return
+            results[index] = error if error is not None else future.result()
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                gathered.set_result(results)
 
-def run_on_ui_thread(func):
-    def wrapper(*args, **kwargs):
-        asyncqt_ui_thread_loop.run_on_ui_thread(func, *args, **kwargs)
+    if not futures:
+        gathered.set_result([])
+    for index, future in enumerate(futures):
+        future.add_done_callback(lambda future, index=index: on_done(index, future))
+    return gathered
+
+
+def _run_into_future(future, func, args, kwargs, log_errors=False):
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(func(*args, **kwargs))
+    except BaseException as e:
+        if log_errors: # fire and forget callers only ever see it in the log
+            logging.exception(e)
+        future.set_exception(e)
+
+COALESCE = "coalesce" # pending calls with the same key collapse into the latest one until the UI thread runs it
+DEBOUNCE = "debounce" # runs `interval` seconds after the last call of a burst
+THROTTLE = "throttle" # runs at most once per `interval` seconds, the first call right away and the latest one at the end
+
+
+def _default_coalesce_key(func):
+    """ one key per instance for methods, one key for functions """
+    try:
+        parameters = list(inspect.signature(func).parameters)
+    except (TypeError, ValueError):
+        parameters = []
+    if parameters and parameters[0] == "self":
+        return lambda *args, **kwargs: id(args[0]) if args else None
+    return lambda *args, **kwargs: None
+
+
+class _PendingCall(object):
+
+    def __init__(self, args, kwargs, deadline):
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.future = TaskFuture() # shared by all the calls collapsed into this one
+
+
+class CoalescingDispatcher(object):
+    """
+    Collapses redundant calls of a UI thread function before they reach the Qt event queue, only the
+    latest params of a key are used. Every call returns the TaskFuture of the run it was collapsed into.
+    """
+
+    def __init__(self, func, mode: str, interval: float = 0, coalesce_key=None):
+        if mode not in (COALESCE, DEBOUNCE, THROTTLE):
+            raise Exception("unsupported mode %s" % mode)
+        self._func = func
+        self._mode = mode
+        self._interval = interval
+        self._key = coalesce_key if callable(coalesce_key) else _default_coalesce_key(func)
+        self._lock = threading.Lock()
+        self._pending = {} # key -> _PendingCall
+        self._last_run = {} # key -> monotonic time, THROTTLE only
+        self._calls = 0
+        self._runs = 0
+
+    def __call__(self, *args, **kwargs) -> TaskFuture:
+        key = self._key(*args, **kwargs)
+        now = time.monotonic()
+        with self._lock:
+            self._calls += 1
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.args, pending.kwargs = args, kwargs
+                pending.deadline = now + self._interval
+                return pending.future
+            pending = self._pending[key] = _PendingCall(args, kwargs, now + self._interval)
+            delay = 0
+            if self._mode == DEBOUNCE:
+                delay = self._interval
+            elif self._mode == THROTTLE:
+                delay = max(0.0, self._last_run.get(key, now - self._interval) + self._interval - now)
+                if len(self._last_run) > 1024: # keys which would run right away anyway
+                    self._last_run = {k: t for k, t in self._last_run.items() if t + self._interval > now}
+        if self._mode == COALESCE:
+            asyncqt_ui_thread_loop.run_on_ui_thread(self._fire, key)
+        else:
+            asyncqt_ui_thread_loop.run_on_ui_thread(QTimer.singleShot, int(delay * 1000), lambda: self._fire(key))
+        return pending.future
+
+    def _fire(self, key):
+        with self._lock:
+            pending = self._pending[key]
+            if self._mode == DEBOUNCE:
+                remaining = pending.deadline - time.monotonic()
+                if remaining > 0: # called again meanwhile
+                    QTimer.singleShot(int(remaining * 1000) + 1, lambda: self._fire(key))
+                    return
+            del self._pending[key]
+            if self._mode == THROTTLE:
+                self._last_run[key] = time.monotonic()
+            self._runs += 1
+        _run_into_future(pending.future, self._func, pending.args, pending.kwargs, True)
+
+    def get_stats(self) -> dict:
+        """ calls, runs and calls saved by collapsing them """
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "runs": self._runs,
+                "pending": len(self._pending),
+                "saved": self._calls - self._runs - len(self._pending)
+            }
+
+
+def _coalescing(func, mode, interval, coalesce_key):
+    dispatcher = CoalescingDispatcher(func, mode, interval, coalesce_key)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> TaskFuture:
+        return dispatcher(*args, **kwargs)
+
+    wrapper.get_stats = dispatcher.get_stats
     return wrapper
 
-def run_on_worker_thread(func):
+def run_on_ui_thread(func=None, coalesce_key=None):
+    """
+    The call returns a TaskFuture, never wait for it on the UI thread.
+    Use as @run_on_ui_thread or @run_on_ui_thread(coalesce_key=fn(*args, **kwargs) or True): calls with the same key
+    waiting for the UI thread collapse into the latest one, True uses one key per instance (methods) or function.
+    """
+    if func is None:
+        return lambda func: run_on_ui_thread(func, coalesce_key)
+    if coalesce_key:
+        return _coalescing(func, COALESCE, 0, coalesce_key)
     @wraps(func)
-    def wrapper(*args, **kwargs):
-        asyncqt_worker_thread_executor.execute(func, *args, **kwargs)
+    def wrapper(*args, **kwargs) -> TaskFuture:
+        future = TaskFuture()
+        asyncqt_ui_thread_loop.run_on_ui_thread(_run_into_future, future, func, args, kwargs, True)
+        return future
     return wrapper
 
+def run_on_ui_thread_debounced(wait: float, coalesce_key=None):
+    """ Runs on the UI thread `wait` seconds after the last call of a burst, with its params. """
+    return lambda func: _coalescing(func, DEBOUNCE, wait, coalesce_key)
+
+def run_on_ui_thread_throttled(rate: float, coalesce_key=None):
+    """ Runs on the UI thread at most `rate` times per second: right away, then with the latest params. """
+    if rate <= 0:
+        raise Exception("rate must be positive, rate=%s" % rate)
+    return lambda func: _coalescing(func, THROTTLE, 1.0 / rate, coalesce_key)
+
+def run_on_worker_thread(func=None, priority=PRIORITY_NORMAL):
+    """ Use as @run_on_worker_thread or @run_on_worker_thread(priority=PRIORITY_BACKGROUND), the call returns a TaskFuture """
+    if func is None:
+        return lambda func: run_on_worker_thread(func, priority)
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> TaskFuture:
+        future = TaskFuture()
+        asyncqt_worker_thread_executor.execute_with_priority(priority, _run_into_future, future, func, args, kwargs, True)
+        return future
+    return wrapper
+
+def run_on_serial_queue(key, priority=PRIORITY_NORMAL):
+    """
+    @run_on_serial_queue(key=fn(*args, **kwargs) or a constant): calls with the same key run one at a time in order
+    on the worker thread pool, the others in parallel. The call returns a TaskFuture.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> TaskFuture:
+            future = TaskFuture()
+            lane = key(*args, **kwargs) if callable(key) else key
+            asyncqt_keyed_serial_executor.execute_with_priority(priority, lane, _run_into_future, future, func, args, kwargs, True)
+            return future
+        return wrapper
+    return decorator
+
+def run_coroutine(coro) -> Future:
+    """ Schedule a coroutine on the shared asyncio event loop, safe to call from any thread. """
+    return asyncqt_event_loop.run_coroutine(coro)
 
 
+async def to_worker(func, *args, priority=PRIORITY_NORMAL, **kwargs):
+    """ await to_worker(fn, ...) runs fn on a worker thread and returns its result, from any asyncio loop. """
+    future = Future()
+    asyncqt_worker_thread_executor.execute_with_priority(priority, _run_into_future, future, func, args, kwargs)
+    return await asyncio.wrap_future(future)
 
+async def to_ui(func, *args, **kwargs):
+    """ await to_ui(fn, ...) runs fn on the UI thread and returns its result, right away when already there. """
+    if isinstance(asyncio.get_running_loop(), QtEventLoop): # it only runs on the UI thread
+        return func(*args, **kwargs)
+    future = Future()
+    asyncqt_ui_thread_loop.run_on_ui_thread(_run_into_future, future, func, args, kwargs)
+    return await asyncio.wrap_future(future)
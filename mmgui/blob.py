@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+import uuid
+
+from PyQt5.QtCore import QCoreApplication, QIODevice
+from PyQt5.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
+
+"""
+Binary results of bound functions (bytes, bytearray, memoryview, or any buffer-protocol object wrapped in a Blob)
+bypass JSON: the reply only carries a `mmgui-blob://<id>` url, js fetches it as an ArrayBuffer and the
+scheme handler serves it straight from the python buffer. A blob can be fetched exactly once.
+
+Other buffers are not sent as blobs unless asked to, a numpy array is still serialized to a JSON array:
+
+    return Blob(samples) # js receives an ArrayBuffer of the raw float64 data
+"""
+
+BLOB_SCHEME = b"mmgui-blob"
+
+logger = logging.getLogger("Blob")
+
+
+def register_blob_scheme():
+    """ Must be called before the QApplication is created, App.run() does it. """
+    if QWebEngineUrlScheme.schemeByName(BLOB_SCHEME).name() == BLOB_SCHEME:
+        return
+    if QCoreApplication.instance() is not None:
+        logger.warning("register %s scheme after QApplication is created, binary results are not available", BLOB_SCHEME)
+        return
+    scheme = QWebEngineUrlScheme(BLOB_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    flags = QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.LocalAccessAllowed
+    if hasattr(QWebEngineUrlScheme, "CorsEnabled"): # Qt >= 5.14
+        flags |= QWebEngineUrlScheme.CorsEnabled
+    scheme.setFlags(flags)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+class Blob(object):
+    """ Sends a buffer-protocol object (e.g. a numpy array) to js as an ArrayBuffer instead of JSON. """
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        memoryview(data) # raise TypeError early, not when the reply is sent
+        self.data = data
+
+
+def is_binary(obj) -> bool:
+    return isinstance(obj, (bytes, bytearray, memoryview, Blob))
+
+
+class BlobStore(object):
+
+    def __init__(self, ttl: float = 60):
+        self._ttl = ttl # unclaimed blobs are freed after `ttl` seconds
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, data) -> str:
+        view = memoryview(data.data if isinstance(data, Blob) else data)
+        if not view.c_contiguous:
+            view = memoryview(view.tobytes())
+        if view.ndim != 1 or view.format != "B":
+            view = view.cast("B")
+        blob_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            self._blobs[blob_id] = (view, now)
+        return "%s://%s" % (BLOB_SCHEME.decode("ascii"), blob_id)
+
+    def take(self, blob_id: str):
+        with self._lock:
+            item = self._blobs.pop(blob_id, None)
+        return item[0] if item else None
+
+    def clear(self):
+        with self._lock:
+            self._blobs.clear()
+
+    def _sweep(self, now):
+        expired = [blob_id for blob_id, (_, created) in self._blobs.items() if now - created > self._ttl]
+        for blob_id in expired:
+            logger.warning("blob %s was never fetched, free it", blob_id)
+            del self._blobs[blob_id]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._blobs)
+
+
+class BlobDevice(QIODevice):
+    """ Read-only QIODevice over a memoryview, Qt reads the python buffer chunk by chunk. """
+
+    def __init__(self, view: memoryview, parent=None):
+        super(BlobDevice, self).__init__(parent)
+        self._view = view
+        self.open(QIODevice.ReadOnly | QIODevice.Unbuffered) # readData() relies on pos()
+
+    def readData(self, maxlen):
+        pos = self.pos()
+        return self._view[pos:pos + maxlen].tobytes()
+
+    def writeData(self, data):
+        return -1
+
+    def size(self):
+        return self._view.nbytes
+
+    def isSequential(self):
+        return False
+
+    def close(self):
+        super(BlobDevice, self).close()
+        self._view = memoryview(b"")
+
+
+class BlobSchemeHandler(QWebEngineUrlSchemeHandler):
+
+    def __init__(self, store: BlobStore, parent=None):
+        super(BlobSchemeHandler, self).__init__(parent)
+        self._store = store
+
+    def requestStarted(self, job: QWebEngineUrlRequestJob):
+        url = job.requestUrl()
+        blob_id = url.host() or url.path().strip("/")
+        view = self._store.take(blob_id)
+        if view is None:
+            logger.warning("blob %s not found", url.toString())
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+        device = BlobDevice(view, job) # freed with the job
+        job.reply(b"application/octet-stream", device)
+
+
+blob_store = BlobStore()
+
+
+def install_blob_scheme_handler(profile):
+    if profile.urlSchemeHandler(BLOB_SCHEME) is None:
+        profile.installUrlSchemeHandler(BLOB_SCHEME, BlobSchemeHandler(blob_store, profile))
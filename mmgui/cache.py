@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+"""
+Memoized results of bound functions, opt-in per function:
+
+    webview.bind_function("get_schema", get_schema, cache={"max_size": 64, "ttl": 300})
+    ...
+    webview.invalidate("get_schema", {"table": "users"}) # or webview.invalidate("get_schema") to drop them all
+
+A hit is answered right in the bridge slot, without a worker thread hop.
+"""
+
+_MISSING = object()
+
+
+def default_cache_key(args: tuple, kwargs: dict) -> str:
+    """ Params come from JSON, so they are keyed by their canonical JSON text. """
+    return json.dumps([args, kwargs], sort_keys=True, separators=(",", ":"), default=repr)
+
+
+class ResultCache(object):
+    """ Thread-safe LRU cache with an optional TTL, the least recently used result is evicted when it is full. """
+
+    def __init__(self, max_size: int = 128, ttl: float = None, key: Callable[[tuple, dict], Any] = default_cache_key):
+        if max_size <= 0:
+            raise Exception("invalid cache max_size %s" % max_size)
+        self._max_size = max_size
+        self._ttl = ttl # seconds, None never expires
+        self._key = key
+        self._results = OrderedDict() # key -> (result, expires_at)
+        self._generation = 0 # bumped by invalidate(), results computed before it are stale
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def make_key(self, args: tuple, kwargs: dict):
+        return self._key(args, kwargs)
+
+    def get(self, key, default=_MISSING):
+        """ :return: the cached result, or `default` (a private sentinel, see `is_miss()`) on a miss """
+        with self._lock:
+            item = self._results.get(key)
+            if item is not None:
+                result, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._results.move_to_end(key)
+                    self._hits += 1
+                    return result
+                del self._results[key]
+                self._expirations += 1
+            self._misses += 1
+            return default
+
+    @staticmethod
+    def is_miss(result) -> bool:
+        return result is _MISSING
+
+    def generation(self) -> int:
+        """ Read it before computing a result, and pass it to `put()`. """
+        with self._lock:
+            return self._generation
+
+    def put(self, key, result, generation: int = None):
+        """ :param generation: of the cache when the call started, the result is dropped if invalidate() ran since """
+        expires_at = time.monotonic() + self._ttl if self._ttl is not None else None
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._results[key] = (result, expires_at)
+            self._results.move_to_end(key)
+            while len(self._results) > self._max_size:
+                self._results.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key=_MISSING):
+        """ Drop the result of one key, or all of them when no key is given. """
+        with self._lock:
+            self._generation += 1 # one key or all, calls still running may have read the old data
+            if key is _MISSING:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "size": len(self._results),
+                "max_size": self._max_size
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
+
+
+def make_result_cache(cache) -> ResultCache:
+    """
+    :param cache: True (default policy), a dict of ResultCache arguments or a ResultCache instance
+    """
+    if isinstance(cache, ResultCache):
+        return cache
+    if cache is True:
+        return ResultCache()
+    if isinstance(cache, dict):
+        return ResultCache(**cache)
+    raise Exception("invalid cache policy %r" % (cache,))
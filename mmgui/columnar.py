@@ -0,0 +1,87 @@
+import array
+import sys
+from typing import Any, Dict
+
+"""
+Columnar results for large numeric data:
+
+    def load_series():
+        return Table({"time": times, "value": values, "label": labels}) # numpy arrays, array.array or lists
+
+    const table = await RPC.invoke("load_series");
+    table.value // Float64Array, no JSON parsing
+
+Numeric columns are packed into one blob as raw little-endian buffers (8-byte aligned) and js views them
+as typed arrays. Columns of other values (e.g. strings) are sent as JSON arrays.
+"""
+
+# dtype -> js typed array, keep in sync with mmgui.js
+DTYPES = ("float64", "float32", "int8", "int16", "int32", "int64", "uint8", "uint16", "uint32", "uint64", "bool")
+
+# array.array / memoryview format -> dtype, by item size for the platform dependent c types
+_FORMATS = {"d": "float64", "f": "float32", "b": "int8", "B": "uint8", "?": "bool"}
+_INT_FORMATS = {"h": "int", "i": "int", "l": "int", "q": "int", "H": "uint", "I": "uint", "L": "uint", "Q": "uint"}
+
+_ALIGNMENT = 8
+
+
+def _column_buffer(values):
+    """ :return: (memoryview, dtype, shape) of a numeric column, None if it has to go as JSON """
+    if hasattr(values, "dtype") and hasattr(values, "shape") and hasattr(values, "astype"): # numpy, not imported
+        dtype = values.dtype.name
+        if dtype not in DTYPES:
+            return None
+        if values.dtype.byteorder == ">" or (values.dtype.byteorder == "=" and sys.byteorder == "big"):
+            values = values.astype(values.dtype.newbyteorder("<"))
+        if not values.flags.c_contiguous:
+            values = values.copy(order="C")
+        return memoryview(values).cast("B"), dtype, list(values.shape)
+    if isinstance(values, (list, tuple)):
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            return None
+        values = array.array("d", values)
+    if isinstance(values, (array.array, memoryview)):
+        view = memoryview(values)
+        format = view.format.lstrip("<=@")
+        if format in _FORMATS:
+            dtype = _FORMATS[format]
+        elif format in _INT_FORMATS:
+            dtype = "%s%d" % (_INT_FORMATS[format], view.itemsize * 8)
+        else:
+            return None
+        if sys.byteorder == "big" and view.itemsize > 1:
+            swapped = array.array(format, view.tobytes())
+            swapped.byteswap()
+            view = memoryview(swapped)
+        return view.cast("B"), dtype, [len(values)] if isinstance(values, array.array) else list(view.shape)
+    return None
+
+
+class Table(object):
+    """ Result of a bound function which reaches js as an object of typed arrays, see the module docs. """
+
+    def __init__(self, columns: Dict[str, Any] = None, **kwargs):
+        self.columns = dict(columns or {}, **kwargs)
+
+    def pack(self):
+        """ :return: (buffer of the numeric columns or None, column descriptions) """
+        columns, buffers, size = [], [], 0
+        for name, values in self.columns.items():
+            column = _column_buffer(values)
+            if column is None:
+                columns.append({"name": name, "values": list(values)})
+                continue
+            view, dtype, shape = column
+            size += -size % _ALIGNMENT # typed arrays need an offset aligned to their element size
+            columns.append({"name": name, "dtype": dtype, "shape": shape, "offset": size, "length": view.nbytes})
+            buffers.append((size, view))
+            size += view.nbytes
+        if not buffers:
+            return None, columns
+        buffer = bytearray(size)
+        for offset, view in buffers:
+            buffer[offset:offset + view.nbytes] = view
+        return buffer, columns
+
+    def __len__(self):
+        return len(self.columns)
@@ -0,0 +1,144 @@
+import random
+import threading
+import time
+from typing import Any, Callable, NoReturn, Union
+
+from PyQt5.QtCore import QTimer
+
+from .asyncqt import asyncqt_ui_thread_loop
+
+"""
+event_stream USAGE:
+------------------------------------------------------
+cpu = webview.create_stream("cpu", max_rate_hz=30, mode="aggregate", aggregate="stats")
+
+@run_on_worker_thread
+def sample_cpu():
+    while True:
+        cpu.push(read_sensor()) # thousands per second, js gets at most 30 frames {count, min, max, mean}
+
+// js
+RPC.subscribe("cpu", (frame) => chart.add(frame.mean));
+------------------------------------------------------
+"""
+
+MODE_LATEST = "latest"       # a frame is the last value pushed
+MODE_AGGREGATE = "aggregate" # a frame is the aggregate of the values pushed since the last frame
+MODE_SAMPLE = "sample"       # a frame is a uniform random sample (list) of the values pushed since the last frame
+
+
+def aggregate_last(acc, value):
+    return value
+
+
+def aggregate_append(acc, value):
+    if acc is None:
+        acc = []
+    acc.append(value)
+    return acc
+
+
+def aggregate_stats(acc, value):
+    if acc is None:
+        return {"count": 1, "min": value, "max": value, "mean": value}
+    acc["count"] += 1
+    acc["min"] = min(acc["min"], value)
+    acc["max"] = max(acc["max"], value)
+    acc["mean"] += (value - acc["mean"]) / acc["count"]
+    return acc
+
+
+AGGREGATORS = {
+    "last": aggregate_last,
+    "append": aggregate_append,
+    "stats": aggregate_stats
+}
+
+
+class EventStream(object):
+    """
+    Rate limited py -> js event stream, it can be pushed from any thread and publishes at most `max_rate_hz`
+    frames per second to the js listeners of its topic (`RPC.subscribe(name, listener)`).
+    Values pushed while the page has no listener are dropped without being aggregated.
+    """
+
+    def __init__(self, webview, name: str, max_rate_hz: float = 30, mode: str = MODE_LATEST,
+                 aggregate: Union[str, Callable[[Any, Any], Any]] = "append", sample_size: int = 100):
+        if mode not in (MODE_LATEST, MODE_AGGREGATE, MODE_SAMPLE):
+            raise Exception("unsupported mode %s" % mode)
+        if max_rate_hz <= 0:
+            raise Exception("max_rate_hz must be positive, max_rate_hz=%s" % max_rate_hz)
+        if mode == MODE_LATEST:
+            aggregate = aggregate_last
+        elif mode == MODE_AGGREGATE and not callable(aggregate):
+            if aggregate not in AGGREGATORS:
+                raise Exception("unsupported aggregate %s" % aggregate)
+            aggregate = AGGREGATORS[aggregate]
+        self.name = name
+        self._webview = webview
+        self._interval = 1.0 / max_rate_hz
+        self._mode = mode
+        self._aggregate = aggregate # reducer (acc, value) -> acc, acc is None for the first value of a frame
+        self._sample_size = sample_size
+        self._lock = threading.Lock()
+        self._acc = None
+        self._seen = 0 # values pushed into the current frame
+        self._last_frame_at = 0.0
+        self._flush_scheduled = False
+        self._closed = False
+        self._stats = {
+            "pushed": 0,
+            "frames": 0,
+            "dropped": 0 # pushed while nobody listened
+        }
+
+    def push(self, value: Any) -> NoReturn:
+        if self._closed:
+            return
+        if not self._webview.has_subscribers(self.name):
+            with self._lock:
+                self._stats["dropped"] += 1
+            return
+        with self._lock:
+            self._stats["pushed"] += 1
+            self._seen += 1
+            if self._mode == MODE_SAMPLE:
+                self._reservoir_add(value)
+            else:
+                self._acc = self._aggregate(self._acc, value)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+            delay = max(0.0, self._last_frame_at + self._interval - time.monotonic())
+        asyncqt_ui_thread_loop.run_on_ui_thread(QTimer.singleShot, int(delay * 1000), self.flush)
+
+    def _reservoir_add(self, value):
+        if self._acc is None:
+            self._acc = []
+        if len(self._acc) < self._sample_size:
+            self._acc.append(value)
+        else:
+            index = random.randrange(self._seen)
+            if index < self._sample_size:
+                self._acc[index] = value
+
+    def flush(self) -> NoReturn:
+        with self._lock:
+            self._flush_scheduled = False
+            if self._seen == 0:
+                return
+            frame = self._acc
+            self._acc = None
+            self._seen = 0
+            self._last_frame_at = time.monotonic()
+            self._stats["frames"] += 1
+        if not self._closed:
+            self._webview.publish(self.name, frame)
+
+    def close(self) -> NoReturn:
+        """ Pending values are dropped, later pushes are ignored. """
+        self._closed = True
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
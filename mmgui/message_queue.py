@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, NoReturn
+
+from PyQt5.QtCore import QCoreApplication, QThread, QTimer
+
+from .asyncqt import asyncqt_ui_thread_loop
+
+"""
+message_queue USAGE:
+------------------------------------------------------
+webview.enable_message_queue(interval=16, max_size=1000, policy="drop")
+
+@run_on_worker_thread
+def report_progress(self):
+    for i in range(100000):
+        # only the latest "progress" message of every flush reaches js
+        webview.send_message_to_js({"type": "progress", "value": i}, key="progress")
+------------------------------------------------------
+"""
+
+POLICY_DROP = "drop"    # a full queue drops its oldest pending message
+POLICY_BLOCK = "block"  # a full queue blocks the producer until the next flush
+
+
+def _is_ui_thread() -> bool:
+    app = QCoreApplication.instance()
+    return app is None or QThread.currentThread() == app.thread()
+
+
+class MessageQueue(object):
+    """
+    Buffered py -> js outbound queue. It can be written from any thread and is flushed on the
+    UI thread once per event loop tick (interval=0) or at most every `interval` milliseconds.
+    """
+
+    def __init__(self, flush_callback: Callable[[List[Any]], None], interval: int = 0, max_size: int = 10000, policy: str = POLICY_DROP):
+        if policy not in (POLICY_DROP, POLICY_BLOCK):
+            raise Exception("unsupported policy %s" % policy)
+        if max_size <= 0:
+            raise Exception("max_size must be positive, max_size=%s" % max_size)
+        self._flush_callback = flush_callback
+        self._interval = interval
+        self._max_size = max_size
+        self._policy = policy
+        self._cond = threading.Condition()
+        self._pending = OrderedDict() # (0, seq) or (1, user key) -> message
+        self._seq = 0
+        self._flush_scheduled = False
+        self._stats = {
+            "sent": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "coalesced": 0,
+            "dropped": 0
+        }
+
+    def put(self, msg: Any, key: Hashable = None) -> NoReturn:
+        schedule = False
+        with self._cond:
+            self._stats["sent"] += 1
+            if key is not None and (1, key) in self._pending:
+                self._pending[(1, key)] = msg # latest value wins, keeps its place in the queue
+                self._stats["coalesced"] += 1
+                return
+            while len(self._pending) >= self._max_size:
+                if self._policy == POLICY_BLOCK and not _is_ui_thread():
+                    self._cond.wait()
+                elif self._policy == POLICY_BLOCK:
+                    self._cond.release() # the UI thread can not wait for itself, flush now instead
+                    try:
+                        self.flush()
+                    finally:
+                        self._cond.acquire()
+                else:
+                    self._pending.popitem(last=False)
+                    self._stats["dropped"] += 1
+            if key is None:
+                self._seq += 1
+                self._pending[(0, self._seq)] = msg
+            else:
+                self._pending[(1, key)] = msg
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                schedule = True
+        if schedule:
+            asyncqt_ui_thread_loop.run_on_ui_thread(self._schedule_flush)
+
+    def _schedule_flush(self):
+        QTimer.singleShot(self._interval, self.flush)
+
+    def flush(self) -> NoReturn:
+        with self._cond:
+            messages = list(self._pending.values())
+            self._pending.clear()
+            self._flush_scheduled = False
+            if messages:
+                self._stats["flushed"] += len(messages)
+                self._stats["flushes"] += 1
+            self._cond.notify_all()
+        if messages:
+            self._flush_callback(messages)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {**self._stats, "pending": len(self._pending)}
@@ -0,0 +1,202 @@
+import bisect
+import threading
+from typing import Sequence
+
+UNKNOWN_FUNCTION = "<unknown>" # label of the calls to names that are not bound, js sends any name it likes
+
+DEFAULT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000) # keep in sync with mmgui.js
+
+# phases of a js -> py call, the last two are measured by js
+BRIDGE_PHASES = (
+    "parse",    # params JSON -> python
+    "queue",    # waiting for a thread, or for the asyncio loop
+    "run",      # the bound function
+    "encode",   # reply python -> JSON
+    "roundtrip",# js sends the call -> js receives the reply
+    "js_parse"  # reply JSON -> js
+)
+
+
+class Histogram(object):
+    """
+    Thread-safe histogram with fixed buckets, recording a value is a bisect and a few increments.
+    Percentiles are interpolated within their bucket, which is precise enough to size pools and spot outliers.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self._bounds = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self._bounds) + 1) # the last bucket is +Inf
+            self._count = 0
+            self._sum = 0.0
+            self._max = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            counts, count, max_value = list(self._counts), self._count, self._max
+        if count == 0:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self._bounds[index - 1] if index > 0 else 0.0
+                upper = self._bounds[index] if index < len(self._bounds) else max_value
+                upper = min(upper, max_value)
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return max_value
+
+    def merge(self, counts: Sequence[int], total: float, max_value: float):
+        """ Add the counts of a histogram recorded elsewhere (js) with the same buckets. """
+        if len(counts) != len(self._counts):
+            raise Exception("histogram buckets mismatch, %d != %d" % (len(counts), len(self._counts)))
+        with self._lock:
+            for index, bucket_count in enumerate(counts):
+                self._counts[index] += bucket_count
+            self._count += sum(counts)
+            self._sum += total
+            self._max = max(self._max, max_value)
+
+    def buckets(self) -> list:
+        """ [(upper bound, cumulative count)], the last bound is float("inf") """
+        with self._lock:
+            counts = list(self._counts)
+        result, cumulative = [], 0
+        for bound, bucket_count in zip(self._bounds + (float("inf"),), counts):
+            cumulative += bucket_count
+            result.append((bound, cumulative))
+        return result
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            count, total, max_value = self._count, self._sum, self._max
+        return {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else 0.0,
+            "max": max_value,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99)
+        }
+
+
+class FunctionMetrics(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.phases = {phase: Histogram() for phase in BRIDGE_PHASES}
+
+    def get_stats(self) -> dict:
+        phases = {phase: histogram.get_stats() for phase, histogram in self.phases.items()}
+        python_ms = sum(phases[phase]["avg"] for phase in ("parse", "queue", "run", "encode", "js_parse"))
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "phases": phases,
+            # qt signal delivery and the web channel, estimated from the averages
+            "transport_avg_ms": max(0.0, phases["roundtrip"]["avg"] - python_ms) if phases["roundtrip"]["count"] else None
+        }
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class BridgeMetrics(object):
+    """ Per-function counters and phase latency histograms (ms) of the js <-> py bridge. """
+
+    def __init__(self):
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str) -> FunctionMetrics:
+        metrics = self._functions.get(name)
+        if metrics is None:
+            with self._lock:
+                metrics = self._functions.setdefault(name, FunctionMetrics())
+        return metrics
+
+    def count_call(self, name: str, request_bytes: int, parse_ms: float):
+        metrics = self._get(name)
+        with self._lock:
+            metrics.calls += 1
+            metrics.request_bytes += request_bytes
+        metrics.phases["parse"].observe(parse_ms)
+
+    def count_error(self, name: str):
+        metrics = self._get(name)
+        with self._lock:
+            metrics.errors += 1
+
+    def count_reply(self, name: str, response_bytes: int, encode_ms: float):
+        metrics = self._get(name)
+        with self._lock:
+            metrics.response_bytes += response_bytes
+        metrics.phases["encode"].observe(encode_ms)
+
+    def observe(self, name: str, phase: str, ms: float):
+        self._get(name).phases[phase].observe(ms)
+
+    def merge(self, name: str, phase: str, counts: Sequence[int], total: float, max_value: float):
+        self._get(name).phases[phase].merge(counts, total, max_value)
+
+    def reset(self):
+        with self._lock:
+            self._functions = {}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            functions = dict(self._functions)
+        return {name: metrics.get_stats() for name, metrics in functions.items()}
+
+    def to_prometheus(self, prefix: str = "mmgui_bridge") -> str:
+        """ Prometheus text exposition format, latencies in seconds. """
+        with self._lock:
+            functions = sorted(self._functions.items())
+        lines = []
+        for metric, attr, help_text in (("calls_total", "calls", "Calls of bound functions"),
+                                        ("errors_total", "errors", "Calls answered with an error"),
+                                        ("request_bytes_total", "request_bytes", "Bytes of call params"),
+                                        ("response_bytes_total", "response_bytes", "Bytes of replies")):
+            lines.append("# HELP %s_%s %s" % (prefix, metric, help_text))
+            lines.append("# TYPE %s_%s counter" % (prefix, metric))
+            for name, metrics in functions:
+                lines.append('%s_%s{function="%s"} %d' % (prefix, metric, _escape_label(name), getattr(metrics, attr)))
+        lines.append("# HELP %s_phase_seconds Latency of each phase of a call" % prefix)
+        lines.append("# TYPE %s_phase_seconds histogram" % prefix)
+        for name, metrics in functions:
+            for phase, histogram in metrics.phases.items():
+                if histogram.count == 0:
+                    continue
+                labels = 'function="%s",phase="%s"' % (_escape_label(name), phase)
+                for bound, cumulative in histogram.buckets():
+                    le = "+Inf" if bound == float("inf") else repr(bound / 1000)
+                    lines.append('%s_phase_seconds_bucket{%s,le="%s"} %d' % (prefix, labels, le, cumulative))
+                stats = histogram.get_stats()
+                lines.append("%s_phase_seconds_sum{%s} %r" % (prefix, labels, stats["sum"] / 1000))
+                lines.append("%s_phase_seconds_count{%s} %d" % (prefix, labels, stats["count"]))
+        return "\n".join(lines) + "\n"
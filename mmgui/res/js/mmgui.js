@@ -11,89 +11,667 @@ if (typeof(window) == "undefined") {
         CONNECTED : 2
     }
 
+    const BatchMode = {
+        NONE : "none",           // every call crosses the bridge on its own
+        MICROTASK : "microtask", // calls issued in the same JS task are sent together
+        FRAME : "frame"          // calls issued in the same animation frame are sent together
+    }
+
+    const STREAM_INITIAL_CREDITS = 16; // keep in sync with mmgui/streaming.py
+    const STORE_TOPIC_PREFIX = "mmgui.store."; // keep in sync with mmgui/store.py
+    const METRIC_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]; // keep in sync with mmgui/metrics.py
+
+    function makeError(name, message) {
+        const error = new Error(message);
+        error.name = name; // python exception type for errors raised by python
+        return error;
+    }
+
+    const TYPED_ARRAYS = { // dtype -> typed array, keep in sync with mmgui/columnar.py
+        float64: Float64Array, float32: Float32Array,
+        int8: Int8Array, int16: Int16Array, int32: Int32Array, int64: typeof(BigInt64Array) != "undefined" ? BigInt64Array : null,
+        uint8: Uint8Array, uint16: Uint16Array, uint32: Uint32Array, uint64: typeof(BigUint64Array) != "undefined" ? BigUint64Array : null,
+        bool: Uint8Array
+    };
+
+    function buildTable(buffer, columns) { // columnar result, the typed arrays are views on the fetched buffer
+        const table = {};
+        for (const column of columns) {
+            if (typeof(column.values) != "undefined") { // not numeric, sent as JSON
+                table[column.name] = column.values;
+                continue;
+            }
+            const TypedArray = TYPED_ARRAYS[column.dtype];
+            if (!TypedArray) {
+                throw new Error("unsupported dtype " + column.dtype + " of column " + column.name);
+            }
+            const array = new TypedArray(buffer, column.offset, column.length / TypedArray.BYTES_PER_ELEMENT);
+            if (column.shape.length > 1) { // row-major
+                array.shape = column.shape;
+            }
+            table[column.name] = array;
+        }
+        return table;
+    }
+
+    function applyOperation(node, tokens, index, operation) { // copies the nodes along the path, the others are shared
+        if (index == tokens.length) {
+            return operation.op == "remove" ? undefined : operation.value;
+        }
+        if (node === null || typeof(node) != "object") {
+            throw new Error("invalid patch path " + operation.path);
+        }
+        const copy = Array.isArray(node) ? node.slice() : Object.assign({}, node);
+        let key = tokens[index];
+        if (Array.isArray(copy)) {
+            key = key == "-" ? copy.length : parseInt(key, 10);
+            if (isNaN(key) || key < 0 || key > copy.length) {
+                throw new Error("invalid patch path " + operation.path);
+            }
+        }
+        if (index < tokens.length - 1) {
+            copy[key] = applyOperation(node[key], tokens, index + 1, operation);
+        } else if (operation.op == "remove") {
+            if (Array.isArray(copy)) {
+                copy.splice(key, 1);
+            } else {
+                delete copy[key];
+            }
+        } else if (operation.op == "add" && Array.isArray(copy)) {
+            copy.splice(key, 0, operation.value);
+        } else if (operation.op == "add" || operation.op == "replace") {
+            copy[key] = operation.value;
+        } else {
+            throw new Error("unsupported patch op " + operation.op);
+        }
+        return copy;
+    }
+
+    function applyPatch(state, patch) { // RFC 6902 add/remove/replace, the state is not mutated (redux friendly)
+        for (const operation of patch) {
+            const tokens = operation.path == "" ? [] : operation.path.slice(1).split("/").map((token) => token.replace(/~1/g, "/").replace(/~0/g, "~"));
+            state = applyOperation(state, tokens, 0, operation);
+        }
+        return state;
+    }
+
+    function canonicalJSON(value) { // object keys sorted, equal params give equal text
+        return JSON.stringify(value, (key, value) => {
+            if (value && typeof(value) == "object" && !Array.isArray(value)) {
+                return Object.keys(value).sort().reduce((sorted, key) => {
+                    sorted[key] = value[key];
+                    return sorted;
+                }, {});
+            }
+            return value;
+        });
+    }
+
     class RPC {
 
         constructor() {
-            this._callbacks = {};
+            this._callbacks = {}; // callbackId -> { callback, timer, signal, onAbort }
+            this._streams = {};
+            this._subscriptions = {}; // topic -> Set of listeners, the topics are mirrored to python
+            this._flights = {}; // method + params -> { callbackId, waiters }, identical in-flight calls of single-flight functions
             this._callbackId = 0;
+            this._pageId = Math.random().toString(36).slice(2) + Date.now().toString(36); // python drops the calls of older pages
+            this.defaultTimeout = 0; // ms, 0 means no timeout
             this.proxy = undefined;
             this._state = RPCState.NOT_CONNECTED;
+            this._connecting = null;
+            this._functionTable = {}; // name -> { id, kind, single_flight }, calls go out by "#<id>" once it is known
+            this._pendingSends = []; // calls made before the channel is connected
+            this._startupMetrics = {
+                connectStartMs: null,     // since navigation start
+                channelConnectMs: null,   // QWebChannel handshake duration
+                pendingCallsAtConnect: 0, // calls queued while connecting
+                firstRpcStartMs: null,    // since navigation start
+                firstRpcLatencyMs: null   // first async call -> its reply
+            };
+            this._batchMode = BatchMode.NONE;
+            this._batch = [];
+            this._batchScheduled = false;
+            this._jsStats = {}; // method -> phase -> histogram, measured here and reported to python
+            this._jsStatsTimer = null;
+            this.statsReportInterval = 5000; // ms
+        }
+
+        setBatchMode(mode) {
+            if (!Object.values(BatchMode).includes(mode)) {
+                throw new Error("invalid batch mode: " + mode);
+            }
+            this._batchMode = mode;
         }
 
         connect() {
+            if (this._connecting) {
+                return this._connecting;
+            }
             this._state = RPCState.CONNECTING;
-            return new Promise((resolve, reject) => {
+            this._startupMetrics.connectStartMs = performance.now();
+            this._connecting = new Promise((resolve, reject) => {
                 new QWebChannel(qt.webChannelTransport, (channel) => {
                     //console.log("on qwebchancel connected", qt.webChannelTransport, channel);
                     this.proxy = channel.objects.proxy;
+                    this.proxy.connect_page(this._pageId);
 
                     this.proxy.on_message.connect(this._onMessage.bind(this));
-                    resolve(this.proxy);
+                    this.proxy.get_function_table((table) => {
+                        this._functionTable = JSON.parse(table);
+                    });
+                    for (const topic of Object.keys(this._subscriptions)) { // subscribed before the channel was up
+                        this.proxy.subscribe(topic);
+                    }
                     this._state = RPCState.CONNECTED;
+                    this._startupMetrics.channelConnectMs = performance.now() - this._startupMetrics.connectStartMs;
+                    this._startupMetrics.pendingCallsAtConnect = this._pendingSends.length;
+                    const sends = this._pendingSends;
+                    this._pendingSends = [];
+                    for (const send of sends) { // flushed in call order, the moment the handshake completes
+                        send();
+                    }
+                    resolve(this.proxy);
                 });
             });
+            return this._connecting;
+        }
+
+        getStartupMetrics() {
+            return Object.assign({}, this._startupMetrics);
         }
 
+        // callback(result, error), without a callback a python error is thrown
         invokeSync(method, params, callback) {
             //console.log("RPC", "invoke", "method", method, "params", params);
+            const onReply = (reply) => {
+                const error = (reply && reply.error) ? makeError(reply.error.type, reply.error.message) : undefined;
+                if (typeof(callback) == "function") {
+                    callback(error ? undefined : reply.result, error);
+                } else if (error) {
+                    throw error;
+                }
+            };
             //return new Promise((resolve, reject) => {
                 if (typeof(this.proxy) == "undefined") {
                     this.connect().then((_) => {
-                        this.proxy.invoke(method, JSON.stringify(params), callback);
+                        this.proxy.invoke(this._resolveMethod(method), JSON.stringify(params), onReply);
                     });
                 } else {
-                    this.proxy.invoke(method, JSON.stringify(params), callback);
+                    this.proxy.invoke(this._resolveMethod(method), JSON.stringify(params), onReply);
                 }
             //});
         }
 
-        invoke(method, params, callback) {
+        // options: { timeout: ms, signal: AbortSignal, singleFlight: bool }, rejects with the python exception type as error.name
+        // single-flight calls share one bridge crossing (and the same result object) with identical calls in flight
+        invoke(method, params, options) {
             return new Promise((resolve, reject) => {
-                this.invokeCallback(method, params, (result) => {
-                    resolve(result);
-                });
+                this.invokeCallback(method, params, (result, error) => {
+                    if (error) {
+                        reject(error);
+                    } else {
+                        resolve(result);
+                    }
+                }, options);
             });
         }
 
-        invokeCallback(method, params, callback) {
+        invokeCallback(method, params, callback, options) {
+            options = (options && typeof(options) == "object") ? options : {};
             const callbackId = ++this._callbackId;
-            this._callbacks[callbackId] = callback;
+            const call = { callback: callback, timer: null, signal: null, onAbort: null, startMs: performance.now(), method: method };
+            if (this._startupMetrics.firstRpcStartMs == null) {
+                this._startupMetrics.firstRpcStartMs = call.startMs;
+                call.first = true;
+            }
+            this._callbacks[callbackId] = call;
             //console.log("RPC", "invoke", "method=", method, ",params=", params, ",callbackId=", callbackId);
 
+            const timeout = typeof(options.timeout) == "number" ? options.timeout : this.defaultTimeout;
+            if (timeout > 0) {
+                call.timer = setTimeout(() => {
+                    this._cancelCall(callbackId, makeError("TimeoutError", method + " timed out after " + timeout + "ms"));
+                }, timeout);
+            }
+            if (options.signal) {
+                if (options.signal.aborted) {
+                    this._cancelCall(callbackId, makeError("AbortError", method + " is aborted"));
+                    return;
+                }
+                call.signal = options.signal;
+                call.onAbort = () => this._cancelCall(callbackId, makeError("AbortError", method + " is aborted"));
+                call.signal.addEventListener("abort", call.onAbort);
+            }
+            if (this._isSingleFlight(method, options)) {
+                this._joinFlight(callbackId, call, method, params);
+                return;
+            }
+            this._whenConnected(() => {
+                if (this._callbacks[callbackId]) { // not cancelled while connecting
+                    this._postMessage(callbackId, method, params);
+                }
+            });
+        }
+
+        _isSingleFlight(method, options) {
+            if (typeof(options.singleFlight) == "boolean") {
+                return options.singleFlight;
+            }
+            const entry = this._functionTable[method];
+            return !!(entry && entry.single_flight);
+        }
+
+        _joinFlight(callbackId, call, method, params) {
+            const key = (typeof(method) == "number" ? "#" + method : method) + ":" + canonicalJSON(params);
+            call.flightKey = key;
+            const flight = this._flights[key];
+            if (flight) {
+                flight.waiters.push(callbackId);
+                return;
+            }
+            const flightId = ++this._callbackId; // the one call that crosses the bridge
+            const newFlight = { callbackId: flightId, waiters: [callbackId] };
+            this._flights[key] = newFlight;
+            this._callbacks[flightId] = {
+                callback: (result, error) => this._landFlight(key, newFlight, result, error),
+                timer: null, signal: null, onAbort: null, startMs: call.startMs, first: call.first, method: method
+            };
+            this._whenConnected(() => {
+                if (this._callbacks[flightId]) {
+                    this._postMessage(flightId, method, params);
+                }
+            });
+        }
+
+        _landFlight(key, flight, result, error) {
+            if (this._flights[key] === flight) { // later calls start a new flight
+                delete this._flights[key];
+            }
+            for (const waiterId of flight.waiters) {
+                const call = this._takeCall(waiterId);
+                if (call) {
+                    call.callback(result, error);
+                }
+            }
+        }
+
+        _takeCall(callbackId) {
+            const call = this._callbacks[callbackId];
+            if (!call) {
+                return null;
+            }
+            delete this._callbacks[callbackId];
+            if (call.timer) {
+                clearTimeout(call.timer);
+            }
+            if (call.signal) {
+                call.signal.removeEventListener("abort", call.onAbort);
+            }
+            return call;
+        }
+
+        _cancelCall(callbackId, error) {
+            const call = this._takeCall(callbackId);
+            if (!call) {
+                return;
+            }
+            const flight = call.flightKey && this._flights[call.flightKey];
+            if (flight && flight.waiters.includes(callbackId)) {
+                flight.waiters.splice(flight.waiters.indexOf(callbackId), 1);
+                if (flight.waiters.length == 0) { // nobody waits anymore, cancel the shared call
+                    this._cancelCall(flight.callbackId, error);
+                }
+                call.callback(undefined, error);
+                return;
+            }
+            const index = this._batch.findIndex((item) => item.callback_id == callbackId);
+            if (index != -1) { // never left the page
+                this._batch.splice(index, 1);
+            } else if (this.proxy) {
+                this.proxy.cancel(callbackId); // drop it if queued, cooperative handlers see current_call().cancelled
+            }
+            call.callback(undefined, error);
+        }
+
+        // for await (const chunk of RPC.stream("query", params)) { ... }, streams a python (async) generator
+        stream(method, params) {
+            const streamId = ++this._callbackId;
+            const state = { chunks: [], done: false, error: null, waiter: null, consumed: 0 };
+            this._streams[streamId] = (message) => {
+                if (message.stream == "data") {
+                    state.chunks.push(message.result);
+                } else {
+                    if (message.stream == "error") {
+                        state.error = message.error;
+                    }
+                    state.done = true;
+                    delete this._streams[streamId];
+                }
+                if (state.waiter) {
+                    const waiter = state.waiter;
+                    state.waiter = null;
+                    waiter();
+                }
+            };
+            this._whenConnected(() => this.proxy.post_stream(streamId, this._resolveMethod(method), JSON.stringify(params)));
+
+            return {
+                [Symbol.asyncIterator]() {
+                    return this;
+                },
+                next: async () => {
+                    while (state.chunks.length == 0 && !state.done) {
+                        await new Promise((resolve) => state.waiter = resolve);
+                    }
+                    if (state.chunks.length > 0) {
+                        const chunk = state.chunks.shift();
+                        state.consumed++;
+                        if (!state.done && state.consumed >= STREAM_INITIAL_CREDITS / 2) { // python may produce more
+                            this.proxy.stream_credit(streamId, state.consumed);
+                            state.consumed = 0;
+                        }
+                        return { value: chunk, done: false };
+                    }
+                    if (state.error) {
+                        const error = makeError(state.error.type, state.error.message);
+                        state.error = null;
+                        throw error;
+                    }
+                    return { value: undefined, done: true };
+                },
+                return: async () => { // break out of for await
+                    if (!state.done) {
+                        state.done = true;
+                        delete this._streams[streamId];
+                        this._whenConnected(() => this.proxy.cancel(streamId));
+                    }
+                    state.chunks = [];
+                    return { value: undefined, done: true };
+                }
+            };
+        }
+
+        // listener(data) is called for every RPC publish(topic, data) of python, returns a function that unsubscribes
+        subscribe(topic, listener) {
+            const unsubscribe = this._addSubscriber(topic, listener);
             if (this._state == RPCState.NOT_CONNECTED) {
-                this.connect().then((_) => {
-                    this.proxy.post_message(callbackId, method, JSON.stringify(params));
-                });
-            } else if (this._state == RPCState.CONNECTING) {
-                setTimeout(() => {
-                    if (this.proxy) {
-                        this.proxy.post_message(callbackId, method, JSON.stringify(params));
+                this.connect();
+            }
+            return unsubscribe;
+        }
+
+        unsubscribe(topic, listener) {
+            const listeners = this._subscriptions[topic];
+            if (!listeners || !listeners.delete(listener) || listeners.size > 0) {
+                return;
+            }
+            delete this._subscriptions[topic];
+            if (this._state == RPCState.CONNECTED) { // python stops serializing the topic
+                this.proxy.unsubscribe(topic);
+            }
+        }
+
+        applyPatch(state, patch) {
+            return applyPatch(state, patch);
+        }
+
+        // mirror of the python Store(webview, name), listener(state, patch) is called with a new state object on every change
+        // (patch is null after a full resync), patches are applied in version order and a gap triggers a resync
+        syncStore(name, listener) {
+            const topic = STORE_TOPIC_PREFIX + name;
+            const store = { state: undefined, version: -1, pending: null, closed: false }; // pending: patches received while resyncing
+            const resync = () => {
+                if (store.pending || store.closed) {
+                    return;
+                }
+                store.pending = [];
+                this.invoke(topic, {}).then((snapshot) => {
+                    const pending = store.pending;
+                    store.pending = null;
+                    if (store.closed) {
+                        return;
                     }
-                }, 300); // TODO: wait connecting
-            } else if (this._state == RPCState.CONNECTED) {
-                this.proxy.post_message(callbackId, method, JSON.stringify(params));
+                    store.state = snapshot.state;
+                    store.version = snapshot.version;
+                    listener(store.state, null);
+                    pending.forEach(onPatch);
+                }, (error) => {
+                    store.pending = null;
+                    console.error("RPC", "resync of store", name, "failed", error);
+                });
+            };
+            const onPatch = (message) => {
+                if (store.pending) {
+                    store.pending.push(message);
+                    return;
+                }
+                if (message.version <= store.version) { // already in the snapshot
+                    return;
+                }
+                if (message.version != store.version + 1) { // missed patches
+                    resync();
+                    return;
+                }
+                try {
+                    store.state = applyPatch(store.state, message.patch);
+                } catch (error) {
+                    console.error("RPC", "patch of store", name, "failed", error);
+                    resync();
+                    return;
+                }
+                store.version = message.version;
+                listener(store.state, message.patch);
+            };
+            const unsubscribe = this.subscribe(topic, onPatch); // subscribed before the snapshot is taken, nothing is lost
+            resync();
+            return {
+                getState: () => store.state,
+                getVersion: () => store.version,
+                resync: resync,
+                close: () => {
+                    store.closed = true;
+                    unsubscribe();
+                }
+            };
+        }
+
+        _addSubscriber(topic, listener) { // does not connect, connect() mirrors the topic
+            let listeners = this._subscriptions[topic];
+            if (!listeners) {
+                listeners = this._subscriptions[topic] = new Set();
+                if (this._state == RPCState.CONNECTED) {
+                    this.proxy.subscribe(topic);
+                }
+            }
+            listeners.add(listener);
+            return () => this.unsubscribe(topic, listener);
+        }
+
+        _publish(topic, data) {
+            const listeners = this._subscriptions[topic];
+            if (!listeners) {
+                return;
+            }
+            for (const listener of Array.from(listeners)) {
+                try {
+                    listener(data);
+                } catch (error) {
+                    console.error("RPC", "listener of topic", topic, "failed", error);
+                }
+            }
+        }
+
+        _whenConnected(send) {
+            if (this._state == RPCState.CONNECTED) {
+                send();
             } else {
-                console.error("invalid state", this._state);
+                this._pendingSends.push(send);
+                if (this._state == RPCState.NOT_CONNECTED) {
+                    this.connect();
+                }
+            }
+        }
+
+        _resolveMethod(method) {
+            if (typeof(method) == "number") { // called by id
+                return "#" + method;
+            }
+            const entry = this._functionTable[method];
+            return entry ? "#" + entry.id : method;
+        }
+
+        _postMessage(callbackId, method, params) {
+            method = this._resolveMethod(method);
+            if (this._batchMode == BatchMode.NONE) {
+                this.proxy.post_message(callbackId, method, JSON.stringify(params));
+                return;
+            }
+            this._batch.push({ callback_id: callbackId, method: method, params: params });
+            if (!this._batchScheduled) {
+                this._batchScheduled = true;
+                if (this._batchMode == BatchMode.FRAME && typeof(window.requestAnimationFrame) == "function") {
+                    window.requestAnimationFrame(() => this._flushBatch());
+                } else {
+                    Promise.resolve().then(() => this._flushBatch());
+                }
+            }
+        }
+
+        _flushBatch() {
+            const calls = this._batch;
+            this._batch = [];
+            this._batchScheduled = false;
+            if (calls.length == 1) {
+                const call = calls[0];
+                this.proxy.post_message(call.callback_id, call.method, JSON.stringify(call.params));
+            } else if (calls.length > 1) {
+                this.proxy.post_message_batch(JSON.stringify(calls)); // one bridge crossing for the whole batch
             }
         }
 
         _onMessage(message) {
+            const parseStartMs = performance.now();
             message = message && JSON.parse(message);
+            const parseMs = performance.now() - parseStartMs;
             //console.log("RPC", "onMessage", message);
             if (!message) {
                 console.error("rpc response message is null");
+                return;
+            }
+            if (typeof(message.function_table) != "undefined") { // functions are bound or unbound
+                this._functionTable = message.function_table;
+                return;
             }
-            if (typeof(this._callbacks[[message.callback_id]]) != "undefined") { // response from rpc call
-                const callback = this._callbacks[[message.callback_id]];
-                callback(message.result);
-                delete this._callbacks[[message.callback_id]];
-            } else { // broadcast
+            if (Array.isArray(message.batch)) { // replies of a batched call
+                for (const item of message.batch) {
+                    this._dispatchMessage(item, parseMs / message.batch.length);
+                }
+            } else {
+                this._dispatchMessage(message, parseMs);
+            }
+        }
+
+        _dispatchMessage(message, parseMs) {
+            if (typeof(message.topic) != "undefined") { // only the listeners of the topic wake up
+                this._publish(message.topic, message.data);
+                return;
+            }
+            if (typeof(message.stream) != "undefined") { // chunk or end of a stream
+                const onStreamMessage = this._streams[message.callback_id];
+                if (onStreamMessage) {
+                    onStreamMessage(message);
+                }
+                return;
+            }
+            if (typeof(message.table) != "undefined") { // columnar result, its numeric columns are in one blob
+                const table = message.table;
+                delete message.table;
+                (table.blob ? this._fetchBlob(table.blob) : Promise.resolve(null)).then((buffer) => {
+                    message.result = buildTable(buffer, table.columns);
+                }).catch((error) => {
+                    console.error("RPC", "fetch table failed", table.blob, error);
+                    message.error = { type: "BlobError", message: error.message };
+                }).then(() => this._dispatchMessage(message, parseMs));
+                return;
+            }
+            if (typeof(message.blob) != "undefined") { // binary result, fetched as an ArrayBuffer
+                this._fetchBlob(message.blob).then((buffer) => {
+                    message.result = buffer;
+                    delete message.blob;
+                    this._dispatchMessage(message, parseMs);
+                }, (error) => {
+                    console.error("RPC", "fetch blob failed", message.blob, error);
+                    delete message.blob;
+                    message.error = { type: "BlobError", message: error.message };
+                    this._dispatchMessage(message, parseMs);
+                });
+                return;
+            }
+            const call = this._takeCall(message.callback_id);
+            if (call && call.first) {
+                this._startupMetrics.firstRpcLatencyMs = performance.now() - call.startMs;
+                this.proxy.report_startup_metrics(JSON.stringify(this._startupMetrics));
+            }
+            if (call) { // response from rpc call
+                const name = typeof(call.method) == "number" ? "#" + call.method : call.method;
+                this._observe(name, "roundtrip", performance.now() - call.startMs);
+                this._observe(name, "js_parse", parseMs || 0);
+                if (typeof(message.error) != "undefined") {
+                    call.callback(undefined, makeError(message.error.type, message.error.message));
+                } else {
+                    call.callback(message.result);
+                }
+            } else if (message.callback_id == -1) { // broadcast
                 var event = document.createEvent('Event');
                 event.initEvent('message', false, true);
                 event.data = message.result;
                 window.dispatchEvent(event); // window.addEventListener('message', event => { });
             }
         }
+
+        _observe(method, phase, ms) {
+            const phases = this._jsStats[method] || (this._jsStats[method] = {});
+            const histogram = phases[phase] || (phases[phase] = { counts: new Array(METRIC_BUCKETS_MS.length + 1).fill(0), sum: 0, max: 0 });
+            const index = METRIC_BUCKETS_MS.findIndex((bound) => ms <= bound);
+            histogram.counts[index == -1 ? METRIC_BUCKETS_MS.length : index]++;
+            histogram.sum += ms;
+            histogram.max = Math.max(histogram.max, ms);
+            if (!this._jsStatsTimer) {
+                this._jsStatsTimer = setTimeout(() => this._reportJsStats(), this.statsReportInterval);
+            }
+        }
+
+        _reportJsStats() {
+            clearTimeout(this._jsStatsTimer);
+            this._jsStatsTimer = null;
+            const stats = this._jsStats;
+            this._jsStats = {};
+            if (this.proxy && Object.keys(stats).length > 0) {
+                this.proxy.report_js_stats(JSON.stringify(stats));
+            }
+        }
+
+        // per function calls, errors, payload bytes and latency percentiles of each phase, see WebView.get_bridge_stats()
+        getBridgeStats() {
+            return new Promise((resolve) => {
+                this._whenConnected(() => {
+                    this._reportJsStats();
+                    this.proxy.get_bridge_stats((stats) => resolve(JSON.parse(stats)));
+                });
+            });
+        }
+
+        _fetchBlob(url) {
+            return new Promise((resolve, reject) => {
+                const xhr = new XMLHttpRequest();
+                xhr.open("GET", url);
+                xhr.responseType = "arraybuffer";
+                xhr.onload = () => resolve(xhr.response);
+                xhr.onerror = () => reject(new Error("failed to fetch " + url));
+                xhr.send();
+            });
+        }
     }
 
     window.RPC = new RPC();
@@ -106,6 +684,8 @@ if (typeof(window) == "undefined") {
 
 (function (window) {
 
+    const DROP_TOPIC = "mmgui.drop"; // keep in sync with mmgui/webview.py
+
     function isRectHint(rect, x, y) {
         return rect.left <= x && x < rect.right
              && rect.top <= y && y < rect.bottom;
@@ -113,56 +693,36 @@ if (typeof(window) == "undefined") {
 
     class DragAndDropHelper {
         constructor() {
-            this._onMessage = this._onMessage.bind(this);
-            window.addEventListener("message", this._onMessage)
-            this._elements = [];
-        }
-
-        _onMessage(event) {
-            if (event && event.data) {
-                var data = event.data;
-                if (typeof(data.type) != "undefined") {
-                    if (data.type == "onDrop") {
-                        console.log("DragAndDropHelper", "onDrop", data.event)
-                        const x = data.event.pos[0];
-                        const y = data.event.pos[1];
-                        this._notifyElements(x, y, "qtDrop", data.event.files);
-                    }
-                }
-            }
+            this._onDrop = this._onDrop.bind(this);
+            window.RPC._addSubscriber(DROP_TOPIC, this._onDrop); // drops arrive once the page connects the RPC
+            this._elements = new Set(); // registered drop targets
         }
 
-        _walkDomTree(node, func) {
-            if (node) {
-                var consumed = func(node);
-                if (!consumed) {
-                    var childCount = node.childNodes.length;
-                    if (childCount > 0) {
-                        for (var i = 0; i < childCount; i++) {
-                            var child = node.childNodes[i];
-                            if (child.nodeType == 1) {
-                                consumed = this._walkDomTree(child, func)
-                                if (consumed) {
-                                    break
-                                }
-                            }
-                        }
-                    }
-                }
+        _onDrop(event) {
+            console.log("DragAndDropHelper", "onDrop", event)
+            const x = event.pos[0];
+            const y = event.pos[1];
+            this._notifyElements(x, y, "qtDrop", event.files);
+
+            var message = document.createEvent('Event'); // drops were broadcast before they had a topic, keep the listeners of that working
+            message.initEvent('message', false, true);
+            message.data = { type: "onDrop", event: event };
+            window.dispatchEvent(message); // window.addEventListener('message', event => { });
+        }
+
+        _dropTargets(x, y) {
+            if (typeof(document.elementsFromPoint) != "function") { // only the registered elements can be hit-tested then
+                return Array.from(this._elements).filter((element) => isRectHint(element.getBoundingClientRect(), x, y));
             }
+            // the engine's hit-test index, cost does not grow with the DOM size and no layout is forced for the other nodes
+            const hits = document.elementsFromPoint(x, y).filter((element) => document.body.contains(element));
+            const registered = hits.filter((element) => this._elements.has(element));
+            return (this._elements.size > 0 ? registered : hits).reverse(); // outermost first, like before
         }
 
         _notifyElements(x, y, eventType, eventData) {
-            var nodeStack = [];
-            this._walkDomTree(document.body, (node) => {
-                var hint = isRectHint(node.getBoundingClientRect(), x, y);
-                if (hint) {
-                    nodeStack.push(node);
-                }
-                return !hint;
-            });
-
-            if (nodeStack.length == 0) {
+            const targets = this._dropTargets(x, y);
+            if (targets.length == 0) {
                 return;
             }
 
@@ -170,26 +730,22 @@ if (typeof(window) == "undefined") {
             event.initEvent(eventType, false, true);
             event.data = eventData;
 
-            for (var key in nodeStack) {
-                var domElement = nodeStack[key];
+            for (const domElement of targets) {
                 domElement.dispatchEvent(event);
                 console.log("DragAndDropHelper", "notifyEvent", event.composed, domElement, x, y);
                 // TODO: event consumed and break
             }
         }
 
+        // once an element is registered only registered elements receive drops, all the elements under the drop otherwise
         registerDropEvent(domElement) {
             console.log("DragAndDropHelper", "registerDropEvent", domElement);
-            this._elements.push(domElement);
-
+            this._elements.add(domElement);
         }
 
         unregisterDropEvent(domElement) {
             console.log("DragAndDropHelper", "unregisterDropEvent", domElement);
-            var index = this._elements.indexOf(domElement);
-            if (index != -1) {
-                delete this._elements[index];
-            }
+            this._elements.delete(domElement);
         }
     }
 
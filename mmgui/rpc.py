@@ -0,0 +1,262 @@
+import contextvars
+import inspect
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict
+
+"""
+rpc USAGE:
+------------------------------------------------------
+def export_report(path):
+    for page in pages:
+        if current_call().cancelled: # js timed out, was aborted or navigated away
+            return None
+        write_page(path, page)
+    return path
+------------------------------------------------------
+"""
+
+
+class RPCError(Exception):
+    pass
+
+
+class CancelledError(RPCError):
+    pass
+
+
+class FunctionNotFoundError(RPCError):
+    pass
+
+
+class InvalidParamsError(RPCError):
+    pass
+
+
+FUNCTION = "function"
+COROUTINE_FUNCTION = "coroutine_function"
+GENERATOR_FUNCTION = "generator_function"
+ASYNC_GENERATOR_FUNCTION = "async_generator_function"
+
+
+def function_kind(py_function: Callable) -> str:
+    if inspect.isasyncgenfunction(py_function):
+        return ASYNC_GENERATOR_FUNCTION
+    if inspect.iscoroutinefunction(py_function):
+        return COROUTINE_FUNCTION
+    if inspect.isgeneratorfunction(py_function):
+        return GENERATOR_FUNCTION
+    return FUNCTION
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        if value.lower() in ("true", "1", "yes", "on"):
+            return True
+        if value.lower() in ("false", "0", "no", "off", ""):
+            return False
+        raise ValueError("invalid bool %r" % value)
+    return bool(value)
+
+
+def _to_int(value):
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError("invalid int %r" % value)
+    return int(value)
+
+
+_COERCIONS = {
+    int: _to_int,
+    float: float,
+    str: str,
+    bool: _to_bool
+}
+
+
+class FunctionEntry(object):
+    """
+    Dispatch entry of a bound function, its signature is introspected once at bind time
+    so that every call is validated up front and fails fast with a clear error.
+    """
+
+    def __init__(self, function_id: int, name: str, py_function: Callable, coerce: bool = False, executor: str = None, cache=None,
+                 single_flight: bool = False, priority: str = None, serial_key=None):
+        self.id = function_id
+        self.name = name
+        self.function = py_function
+        self.kind = function_kind(py_function)
+        self.executor = executor
+        self.cache = cache # ResultCache of a memoized function
+        self.single_flight = single_flight # identical concurrent calls share one execution
+        self.priority = priority # worker thread lane
+        self.serial_key = serial_key # param name or fn(*args, **kwargs), calls with the same key run one at a time
+        self._checked = True
+        self._positional_only = ()
+        self._positional = () # names in order, params given as a js array are mapped on them
+        self._names = frozenset()
+        self._required = frozenset()
+        self._var_positional = False
+        self._var_keyword = False
+        self._coercions = {}
+        try:
+            signature = inspect.signature(py_function)
+        except (TypeError, ValueError): # some builtins have no signature, pass params through unchecked
+            self._checked = False
+            return
+        positional_only, positional, names, required = [], [], [], []
+        for param in signature.parameters.values():
+            if param.kind == param.VAR_POSITIONAL:
+                self._var_positional = True
+                continue
+            if param.kind == param.VAR_KEYWORD:
+                self._var_keyword = True
+                continue
+            if param.kind == param.POSITIONAL_ONLY:
+                positional_only.append(param.name)
+            if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+                positional.append(param.name)
+            names.append(param.name)
+            if param.default is param.empty:
+                required.append(param.name)
+            if coerce and param.annotation in _COERCIONS:
+                self._coercions[param.name] = _COERCIONS[param.annotation]
+        self._positional_only = tuple(positional_only)
+        self._positional = tuple(positional)
+        self._names = frozenset(names)
+        self._required = frozenset(required)
+        if isinstance(serial_key, str) and serial_key not in self._names:
+            raise Exception("serial_key %s is not a param of %s()" % (serial_key, name))
+
+    def bind(self, params) -> tuple:
+        """ Map the params sent by js (an object or an array) to (args, kwargs), raise InvalidParamsError. """
+        args = ()
+        if params is None:
+            params = {}
+        elif isinstance(params, list):
+            if len(params) > len(self._positional):
+                if not self._var_positional:
+                    raise InvalidParamsError("%s() takes %d positional params but %d were given" % (self.name, len(self._positional), len(params)))
+                args = tuple(params[len(self._positional):])
+            params = dict(zip(self._positional, params))
+        elif not isinstance(params, dict):
+            raise InvalidParamsError("%s() params must be an object or an array, got %s" % (self.name, type(params).__name__))
+        if not self._checked:
+            return args, params
+        keys = params.keys()
+        if not self._var_keyword and not keys <= self._names:
+            raise InvalidParamsError("%s() got unexpected params: %s" % (self.name, ", ".join(sorted(keys - self._names))))
+        if not self._required <= keys:
+            raise InvalidParamsError("%s() missing required params: %s" % (self.name, ", ".join(sorted(self._required - keys))))
+        if self._coercions:
+            params = dict(params)
+            for name, coercion in self._coercions.items():
+                if name in params:
+                    try:
+                        params[name] = coercion(params[name])
+                    except (TypeError, ValueError) as e:
+                        raise InvalidParamsError("%s() param %s: %s" % (self.name, name, e))
+        if self._positional_only or args:
+            names = self._positional_only if not args else self._positional
+            count = 0
+            while count < len(names) and names[count] in params:
+                count += 1
+            skipped = [name for name in names[count:] if name in params]
+            if skipped: # packing them would shift them onto the omitted param
+                raise InvalidParamsError("%s() positional-only params %s can not be given without %s" % (self.name, ", ".join(skipped), names[count]))
+            args = tuple(params.pop(name) for name in names[:count]) + args
+        return args, params
+
+    def serial_key_of(self, args, kwargs):
+        """ Key of the serial lane of a call, from the (args, kwargs) returned by bind(). """
+        if callable(self.serial_key):
+            return self.serial_key(*args, **kwargs)
+        if self.serial_key in kwargs:
+            return kwargs[self.serial_key]
+        arguments = inspect.signature(self.function).bind_partial(*args, **kwargs) # positional-only or omitted
+        arguments.apply_defaults() # an omitted param is keyed by its default, not by a lane shared by every function
+        return arguments.arguments[self.serial_key]
+
+    def describe(self) -> dict:
+        description = {"id": self.id, "kind": self.kind}
+        if self.single_flight: # js dedupes them as well
+            description["single_flight"] = True
+        return description
+
+
+class DispatchTable(object):
+    """ Bound functions by name and by "#<id>", js calls either one with a single dict lookup. """
+
+    def __init__(self):
+        self._entries = {}
+        self._ids = itertools.count(1)
+
+    def bind(self, name: str, py_function: Callable, **options) -> FunctionEntry:
+        self.unbind(name)
+        entry = FunctionEntry(next(self._ids), name, py_function, **options)
+        self._entries[name] = entry
+        self._entries["#%d" % entry.id] = entry
+        return entry
+
+    def unbind(self, name: str):
+        entry = self._entries.pop(name, None)
+        if entry:
+            del self._entries["#%d" % entry.id]
+
+    def get(self, name: str) -> FunctionEntry:
+        entry = self._entries.get(name)
+        if entry is None:
+            raise FunctionNotFoundError("function %s is not bound" % name)
+        return entry
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def describe(self) -> Dict[str, Any]:
+        return {name: entry.describe() for name, entry in self._entries.items() if not name.startswith("#")}
+
+
+class CallContext(object):
+    """ One pending async call from js, it is cancelled when js times out or aborts the call. """
+
+    def __init__(self, callback_id: str, function_name: str):
+        self.callback_id = callback_id
+        self.function_name = function_name
+        self.created_at = time.perf_counter() # the queue phase starts here
+        self.future = None # concurrent.futures.Future of a coroutine call
+        self.cache = None # (ResultCache, key, generation) of a memoized call, the result is stored when it succeeds
+        self.flight_key = None # key of the single-flight execution this call waits for
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def raise_if_cancelled(self):
+        if self._cancelled.is_set():
+            raise CancelledError("call %s(%s) is cancelled" % (self.function_name, self.callback_id))
+
+
+_current_call = contextvars.ContextVar("mmgui_current_call", default=None)
+
+
+def current_call() -> CallContext:
+    """ Context of the call being handled by the current thread or coroutine, None outside of a js call. """
+    return _current_call.get()
+
+
+def set_current_call(context: CallContext):
+    return _current_call.set(context)
+
+
+def reset_current_call(token):
+    _current_call.reset(token)
+
+
+def error_to_dict(e: BaseException) -> dict:
+    return {"type": type(e).__name__, "message": str(e)}
@@ -0,0 +1,106 @@
+import datetime
+import decimal
+import enum
+import json
+import uuid
+from typing import Any
+
+try:
+    import dataclasses
+except ImportError: # python 3.6
+    dataclasses = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+Serializers of the js <-> py bridge. Both backends natively encode these types the same way:
+    dataclass   -> object
+    datetime    -> ISO 8601 string (date, time as well)
+    Decimal     -> string, no precision is lost
+    UUID        -> string
+    Enum        -> its value
+    set         -> array
+    numpy array -> array (numpy scalars -> number)
+
+The JSON text may still differ: json writes NaN and Infinity (not valid JSON), orjson writes null.
+orjson also encodes datetime, UUID and Enum dict keys, and rejects integers beyond 64 bits.
+"""
+
+
+def default_encoder(obj: Any) -> Any:
+    if dataclasses and dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if type(obj).__module__ == "numpy" and hasattr(obj, "tolist"): # ndarray and numpy scalars, without importing numpy
+        return obj.tolist()
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+
+class Serializer(object):
+    name = None
+
+    def dumps(self, obj: Any) -> str:
+        raise NotImplementedError
+
+    def loads(self, text: str) -> Any:
+        raise NotImplementedError
+
+
+class JsonSerializer(Serializer):
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(default=default_encoder, separators=(",", ":"))
+        self._decoder = json.JSONDecoder()
+
+    def dumps(self, obj: Any) -> str:
+        return self._encoder.encode(obj)
+
+    def loads(self, text: str) -> Any:
+        return self._decoder.decode(text)
+
+
+class OrjsonSerializer(Serializer):
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise Exception("orjson is not installed, run `pip install orjson`")
+        self._option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> str:
+        return orjson.dumps(obj, default=default_encoder, option=self._option).decode("utf-8")
+
+    def loads(self, text: str) -> Any:
+        return orjson.loads(text)
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    OrjsonSerializer.name: OrjsonSerializer
+}
+
+
+def get_serializer(serializer="auto") -> Serializer:
+    """
+    :param serializer: "auto" (orjson when installed, otherwise json), a name in SERIALIZERS or a Serializer instance
+    """
+    if isinstance(serializer, Serializer):
+        return serializer
+    if serializer is None or serializer == "auto":
+        serializer = OrjsonSerializer.name if orjson is not None else JsonSerializer.name
+    if serializer not in SERIALIZERS:
+        raise Exception("unsupported serializer %s" % serializer)
+    return SERIALIZERS[serializer]()
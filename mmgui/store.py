@@ -0,0 +1,173 @@
+import copy
+import threading
+from typing import Any, List, Union
+
+from PyQt5.QtCore import QTimer
+
+from .asyncqt import asyncqt_ui_thread_loop
+
+"""
+store USAGE:
+------------------------------------------------------
+store = Store(win.webview, "app", {"user": None, "jobs": []})
+
+@run_on_worker_thread
+def on_job_done(job):
+    store.append("/jobs", job)                  # -> {"op": "add", "path": "/jobs/-", "value": job}
+    store.set(["stats", "done"], done_count)    # -> {"op": "replace", ...}
+
+// js, redux:
+RPC.syncStore("app", (state) => reduxStore.dispatch({ type: "mmgui/store/app", state: state }));
+------------------------------------------------------
+Mutations are applied right away and sent to js as RFC 6902 JSON patches, batched once per event loop tick.
+Every batch increments the version, js resyncs the whole state when it sees a gap or (re)connects.
+"""
+
+Path = Union[str, List[Union[str, int]]]
+
+
+def _escape(token) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def parse_path(path: Path) -> list:
+    """ JSON pointer ("/jobs/0/name") or a list of keys and indexes -> list of tokens """
+    if isinstance(path, (list, tuple)):
+        return list(path)
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise Exception("invalid JSON pointer %s" % path)
+    return [_unescape(token) for token in path[1:].split("/")]
+
+
+def format_path(tokens: list) -> str:
+    return "".join("/" + _escape(token) for token in tokens)
+
+
+def _key(container, token):
+    if isinstance(container, list):
+        if token == "-":
+            return len(container)
+        index = int(token)
+        if index < 0: # counted from the end in python only, a JSON pointer has no negative index
+            index += len(container)
+            if index < 0:
+                raise IndexError("list index %s out of range" % token)
+        return index
+    return token
+
+
+class Store(object):
+
+    def __init__(self, webview, name: str, state: dict = None):
+        self.name = name
+        self.topic = "mmgui.store.%s" % name # keep in sync with mmgui.js
+        self._webview = webview
+        self._state = copy.deepcopy(state) if state is not None else {}
+        self._version = 0
+        self._pending = [] # patch ops of this tick
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+        webview.bind_function(self.topic, self.snapshot)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, path: Path = "", default: Any = None) -> Any:
+        """ The stored value, do not mutate it, changes must go through set/remove/append. """
+        with self._lock:
+            value = self._state
+            try:
+                for token in parse_path(path):
+                    value = value[_key(value, token)]
+            except (KeyError, IndexError, ValueError, TypeError):
+                return default
+            return value
+
+    def set(self, path: Path, value: Any):
+        tokens = parse_path(path)
+        if not tokens:
+            raise Exception("the root of store %s can not be set, use replace_state()" % self.name)
+        value = copy.deepcopy(value) # later changes of the caller's object would not be sent
+        with self._lock:
+            container, parents = self._container(tokens)
+            key = _key(container, tokens[-1])
+            if isinstance(container, list) and key == len(container):
+                container.append(value)
+                op = "add"
+            else:
+                op = "replace" if self._has(container, key) else "add"
+                container[key] = value
+            path = format_path(parents + [tokens[-1] if tokens[-1] == "-" else key])
+            self._record({"op": op, "path": path, "value": copy.deepcopy(value)})
+
+    def remove(self, path: Path):
+        tokens = parse_path(path)
+        with self._lock:
+            container, parents = self._container(tokens)
+            key = _key(container, tokens[-1])
+            if not self._has(container, key):
+                raise Exception("%s not found in store %s" % (format_path(tokens), self.name))
+            del container[key]
+            self._record({"op": "remove", "path": format_path(parents + [key])})
+
+    def append(self, path: Path, value: Any):
+        self.set(parse_path(path) + ["-"], value)
+
+    def replace_state(self, state: dict):
+        state = copy.deepcopy(state)
+        with self._lock:
+            self._state = state
+            self._record({"op": "replace", "path": "", "value": copy.deepcopy(state)})
+
+    def snapshot(self) -> dict:
+        """ Bound to js as "mmgui.store.<name>", pending patches are sent first so that the version is exact. """
+        with self._lock:
+            self._flush_locked()
+            return {"version": self._version, "state": copy.deepcopy(self._state)}
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _container(self, tokens):
+        """ The parent of the last token, and the keys leading to it with negative list indexes resolved. """
+        container = self._state
+        parents = []
+        for token in tokens[:-1]:
+            key = _key(container, token)
+            parents.append(key)
+            container = container[key]
+        return container, parents
+
+    @staticmethod
+    def _has(container, key) -> bool:
+        if isinstance(container, list):
+            return isinstance(key, int) and 0 <= key < len(container)
+        return key in container
+
+    def _record(self, op):
+        # op values are copies, the message queue serializes them later while the state keeps changing
+        last = self._pending[-1] if self._pending else None
+        if last is not None and op["op"] == "replace" and last["op"] in ("add", "replace") and last["path"] == op["path"]:
+            last["value"] = op["value"] # the same path changed twice in one tick
+        else:
+            self._pending.append(op)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncqt_ui_thread_loop.run_on_ui_thread(QTimer.singleShot, 0, self.flush)
+
+    def _flush_locked(self):
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+        patch, self._pending = self._pending, []
+        self._version += 1
+        # published while locked, patches reach js in version order
+        self._webview.publish(self.topic, {"version": self._version, "patch": patch})
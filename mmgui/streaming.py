@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import threading
+from typing import Callable
+
+from .rpc import error_to_dict
+
+"""
+Bound generators and async generators are streamed to js as an async iterator:
+
+    for await (const rows of RPC.stream("query", {"sql": sql})) { ... }
+
+Flow control is credit based: the producer may only pull one chunk from the generator per credit, js grants
+new credits as it consumes chunks. A slow renderer therefore throttles the python producer instead of
+letting messages pile up in the Qt event loop.
+"""
+
+STREAM_INITIAL_CREDITS = 16 # keep in sync with mmgui.js
+
+logger = logging.getLogger("Stream")
+
+
+def _wake_up(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Stream(object):
+
+    def __init__(self, stream_id: str, send_callback: Callable[[dict], None], credits: int = STREAM_INITIAL_CREDITS):
+        self.stream_id = stream_id
+        self._send_callback = send_callback
+        self._credits = credits
+        self._cancelled = False
+        self._cond = threading.Condition()
+        self._waiter = None # asyncio future of an async producer waiting for credits
+        self._waiter_loop = None
+
+    def grant(self, credits: int):
+        with self._cond:
+            self._credits += credits
+            self._notify()
+
+    def cancel(self):
+        with self._cond:
+            self._cancelled = True
+            self._notify()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled
+
+    def _notify(self):
+        self._cond.notify_all()
+        if self._waiter is not None:
+            self._waiter_loop.call_soon_threadsafe(_wake_up, self._waiter)
+            self._waiter = None
+
+    def _acquire(self) -> bool:
+        with self._cond:
+            while self._credits <= 0 and not self._cancelled:
+                self._cond.wait()
+            if self._cancelled:
+                return False
+            self._credits -= 1
+            return True
+
+    async def _acquire_async(self) -> bool:
+        loop = asyncio.get_event_loop()
+        while True:
+            with self._cond:
+                if self._cancelled:
+                    return False
+                if self._credits > 0:
+                    self._credits -= 1
+                    return True
+                self._waiter = loop.create_future()
+                self._waiter_loop = loop
+                waiter = self._waiter
+            await waiter
+
+    def _send(self, state: str, **kwargs):
+        self._send_callback({"callback_id": self.stream_id, "stream": state, **kwargs})
+
+    def fail(self, e: Exception):
+        logger.exception("stream %s failed: %s", self.stream_id, e)
+        self._send("error", error=error_to_dict(e))
+
+    def run(self, generator):
+        """ Drain a generator, runs on a worker thread which is blocked while there are no credits. """
+        try:
+            while self._acquire():
+                try:
+                    chunk = next(generator)
+                except StopIteration:
+                    self._send("end")
+                    return
+                self._send("data", result=chunk)
+            generator.close() # cancelled, runs the generator's finally blocks
+        except Exception as e:
+            self.fail(e)
+
+    async def run_async(self, async_generator):
+        """ Drain an async generator on the asyncio event loop, no thread is held while waiting for credits. """
+        try:
+            while await self._acquire_async():
+                try:
+                    chunk = await async_generator.__anext__()
+                except StopAsyncIteration:
+                    self._send("end")
+                    return
+                self._send("data", result=chunk)
+            await async_generator.aclose()
+        except Exception as e:
+            self.fail(e)
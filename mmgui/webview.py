@@ -1,7 +1,11 @@
+import asyncio
 import codecs
-import json
+import inspect
 import logging
 import os
+import pickle
+import threading
+import time
 from typing import NoReturn, Callable, Any
 
 from PyQt5 import QtCore, QtWidgets
@@ -11,8 +15,19 @@ from PyQt5.QtGui import QDragEnterEvent, QDragLeaveEvent, QDropEvent, QKeyEvent,
 from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineScript, QWebEngineSettings
 from PyQt5.QtWebChannel import QWebChannel
 
-from .asyncqt import run_on_worker_thread
+from .asyncqt import run_on_worker_thread, run_coroutine, asyncqt_worker_thread_executor, asyncqt_ui_thread_loop, \
+    asyncqt_process_executor, asyncqt_event_loop, asyncqt_keyed_serial_executor, EXECUTOR_UI, EXECUTOR_THREAD, EXECUTOR_PROCESS, EXECUTORS, PRIORITIES, PRIORITY_INTERACTIVE
+from .columnar import Table
+from .cache import ResultCache, make_result_cache, default_cache_key
+from .event_stream import EventStream
+from .blob import install_blob_scheme_handler, blob_store, is_binary
 from .menu import MenuSeparator
+from .message_queue import MessageQueue
+from .metrics import BridgeMetrics, UNKNOWN_FUNCTION
+from .rpc import CallContext, DispatchTable, function_kind, FUNCTION, COROUTINE_FUNCTION, GENERATOR_FUNCTION, ASYNC_GENERATOR_FUNCTION, set_current_call, reset_current_call, error_to_dict, RPCError, \
+    InvalidParamsError, FunctionNotFoundError
+from .serializer import Serializer, get_serializer
+from .streaming import Stream
 from .webview_window_ui import Ui_WebViewWindowUI
 
 
@@ -23,11 +38,17 @@ g_default_configs = {
     "frameless": False,
     "statusbar": False,
     "menu": None,
-    "title": "mmgui"
+    "title": "mmgui",
+    "serializer": "auto", # "auto", "json", "orjson" or a Serializer instance
+    "message_queue": None # e.g. {"interval": 16, "max_size": 10000, "policy": "drop"}
 }
 
 logger = logging.getLogger("WebView")
 
+DROP_TOPIC = "mmgui.drop" # keep in sync with mmgui.js
+
+_NO_RESULT = object()
+
 
 class MyQWebEngineView(QWebEngineView):
     """
@@ -100,45 +121,613 @@ class CookiesJar(object):
 class WebViewBridge(QObject):
 
     on_message = pyqtSignal(str) # py -> js
+    on_startup_metrics = pyqtSignal(dict)
 
-    def __init__(self, webview_window):
+    def __init__(self, webview_window, serializer=None):
         super().__init__()
         self._webview_window = webview_window
-        self._function_map = {}
-
-    def bind_function(self, js_function_name, py_function):
+        self._serializer = get_serializer(serializer)
+        self._dispatch_table = DispatchTable()
+        self._calls = {} # callback_id -> CallContext of pending async calls
+        self._calls_lock = threading.Lock() # replies are taken from worker, asyncio and process pool threads
+        self._page_id = None # generation of the page which connected last, set by its handshake
+        self._streams = {} # callback_id -> Stream
+        self._flights = {} # (function id, params key) -> [leader CallContext, followers...] of single-flight calls
+        self._flights_lock = threading.Lock()
+        self._message_queue = None
+        self._startup_metrics = None
+        self._metrics = BridgeMetrics()
+        self._topics = set() # topics js subscribed to, nothing is serialized for the others
+
+    def bind_function(self, js_function_name, py_function, coerce=False, executor=EXECUTOR_THREAD, cache=None,
+                      single_flight=False, priority=PRIORITY_INTERACTIVE, serial_key=None) -> int:
         print("bind_function %s " % js_function_name)
-        self._function_map[js_function_name] = py_function
+        if priority not in PRIORITIES:
+            raise Exception("unknown priority %s" % priority)
+        if executor not in EXECUTORS: # a typo would otherwise run the calls somewhere unexpected
+            raise ValueError("unknown executor %r, expected one of %s, serialize calls with serial_key" % (executor, ", ".join(EXECUTORS)))
+        if executor != EXECUTOR_THREAD and function_kind(py_function) != FUNCTION:
+            raise Exception("executor %s only supports plain functions, %s is a %s" % (executor, js_function_name, function_kind(py_function)))
+        if executor == EXECUTOR_PROCESS:
+            try:
+                pickle.dumps(py_function)
+            except Exception as e:
+                raise Exception("%s can not run on the process pool, it is not picklable: %s" % (js_function_name, e))
+        if serial_key is not None and (executor != EXECUTOR_THREAD or function_kind(py_function) != FUNCTION):
+            raise Exception("serial_key needs a plain function on the thread executor, %s is a %s on %s" % (js_function_name, function_kind(py_function), executor))
+        if (cache or single_flight) and function_kind(py_function) not in (FUNCTION, COROUTINE_FUNCTION):
+            raise Exception("results of %s can not be shared, it is a %s" % (js_function_name, function_kind(py_function)))
+        cache = make_result_cache(cache) if cache else None
+        entry = self._dispatch_table.bind(js_function_name, py_function, coerce=coerce, executor=executor, cache=cache,
+                                          single_flight=single_flight, priority=priority, serial_key=serial_key)
+        self._send_function_table()
+        return entry.id
 
     def unbind_function(self, js_function_name):
-        del self._function_map[js_function_name]
+        self._dispatch_table.unbind(js_function_name)
+        self._send_function_table()
+
+    def invalidate(self, js_function_name, params=None):
+        """ Drop the cached result of `params`, or every cached result of the function when params is None. """
+        entry = self._dispatch_table.get(js_function_name)
+        if entry.cache is None:
+            return
+        if params is None:
+            entry.cache.invalidate()
+        else:
+            args, kwargs = entry.bind(params)
+            entry.cache.invalidate(entry.cache.make_key(args, kwargs))
+
+    def get_cache_stats(self, js_function_name) -> dict:
+        entry = self._dispatch_table.get(js_function_name)
+        return entry.cache.get_stats() if entry.cache is not None else None
 
-    @pyqtSlot(str, str, name='invoke', result=QVariant) # js -> py, sync call
+    @pyqtSlot(name='get_function_table', result=str) # js -> py, name -> {id, kind} of the bound functions
+    def get_function_table(self):
+        return self._serializer.dumps(self._dispatch_table.describe())
+
+    def _send_function_table(self):
+        self.on_message.emit(self._serializer.dumps({ "function_table": self._dispatch_table.describe()}))
+
+    @pyqtSlot(str, str, name='invoke', result=QVariant) # js -> py, sync call, answers {"result": ...} or {"error": {type, message}}
     def invoke(self, function_name, params):
-        if params:
-            params = json.loads(params)
-        else:
-            params = {}
-        result = None
-        if function_name in self._function_map:
-            result = self._function_map[function_name](**params)
+        started = time.perf_counter()
+        try:
+            entry, args, kwargs = self._prepare_call(function_name, self._serializer.loads(params) if params else None)
+            parsed = time.perf_counter()
+            self._metrics.count_call(entry.name, len(params), (parsed - started) * 1000)
+            if entry.kind in (COROUTINE_FUNCTION, ASYNC_GENERATOR_FUNCTION): # waiting on the event loop blocks the UI thread, or deadlocks it with App(use_asyncio=True)
+                raise RPCError("%s() is a coroutine function, it can only be invoked asynchronously" % entry.name)
+            if entry.cache is None:
+                result = self._call_function(entry, args, kwargs)
+            else:
+                key = entry.cache.make_key(args, kwargs)
+                generation = entry.cache.generation()
+                result = entry.cache.get(key)
+                if ResultCache.is_miss(result):
+                    result = self._call_function(entry, args, kwargs)
+                    entry.cache.put(key, result, generation)
+            self._metrics.observe(entry.name, "run", (time.perf_counter() - parsed) * 1000)
+            return { "result": result }
+        except Exception as e: # an exception escaping a slot aborts the application
+            logger.exception("call %s failed: %s", function_name, e)
+            self._metrics.count_error(self._metric_name(function_name))
+            return { "error": error_to_dict(e) }
+
+    def _prepare_call(self, function_name, params):
+        """ Resolve the function by name or "#<id>" and validate its params, raise RPCError. """
+        entry = self._dispatch_table.get(function_name)
+        args, kwargs = entry.bind(params)
+        return entry, args, kwargs
+
+    def _call_function(self, entry, args, kwargs):
+        result = entry.function(*args, **kwargs)
+        if inspect.isgenerator(result):
+            result = list(result)
+        elif inspect.isasyncgen(result) or asyncio.iscoroutine(result): # a plain function returning one, blocks the calling thread
+            if asyncqt_event_loop.is_loop_thread(): # App(use_asyncio=True) and executor="ui", waiting here would deadlock
+                if asyncio.iscoroutine(result):
+                    result.close()
+                raise RPCError("%s() returned a coroutine on the event loop thread, it can not be waited for" % entry.name)
+            if inspect.isasyncgen(result):
+                result = _collect_async_generator(result)
+            result = run_coroutine(result).result()
         return result
 
     @pyqtSlot(str, str, str, name='post_message') # js -> py, ansync call(Callback or Promise)
     def js_post_message_to_py(self, callback_id, function_name, params):
-        self.invoke_on_worker_thread(callback_id, function_name, params)
+        started = time.perf_counter()
+        try:
+            entry, args, kwargs = self._prepare_call(function_name, self._serializer.loads(params) if params else None)
+        except Exception as e: # unknown function or invalid params fail fast, without a worker thread hop
+            logger.warning("call %s rejected: %s", function_name, e)
+            self._metrics.count_error(self._metric_name(function_name))
+            self.py_reply_error_to_js(callback_id, e)
+            return
+        self._metrics.count_call(entry.name, len(params), (time.perf_counter() - started) * 1000)
+        context = CallContext(callback_id, entry.name)
+        if entry.cache is not None:
+            key = entry.cache.make_key(args, kwargs)
+            generation = entry.cache.generation() # before the lookup, an invalidate() after it drops the result
+            result = entry.cache.get(key)
+            if not ResultCache.is_miss(result): # answered right here, without a worker thread hop
+                self.py_reply_message_to_js(callback_id, result, entry.name)
+                return
+            context.cache = (entry.cache, key, generation)
+        self._add_call(context)
+        if entry.single_flight and self._join_flight(context, entry, args, kwargs):
+            return
+        self._dispatch_call(context, entry, args, kwargs) # only the execution waits for its executor
+
+    def _join_flight(self, context, entry, args, kwargs) -> bool:
+        """ True if an identical call is running, the context is answered with its result. Otherwise it leads a new flight. """
+        params_key = context.cache[1] if context.cache is not None else default_cache_key(args, kwargs)
+        flight_key = (entry.id, params_key)
+        context.flight_key = flight_key
+        with self._flights_lock:
+            flight = self._flights.get(flight_key)
+            if flight is not None:
+                flight.append(context)
+                return True
+            self._flights[flight_key] = [context]
+            return False
+
+    def _leave_flight(self, context) -> bool:
+        """ Called when js cancels the call, True if other calls still wait for the execution, so it must go on. """
+        if context.flight_key is None:
+            return False
+        with self._flights_lock:
+            flight = self._flights.get(context.flight_key)
+            if flight is None or context not in flight:
+                return False
+            if any(self._calls.get(waiter.callback_id) is waiter for waiter in flight):
+                return True
+            del self._flights[context.flight_key]
+        flight[0].cancel() # nobody waits for the leader's execution anymore
+        return False
+
+    def _dispatch_call(self, context, entry, args, kwargs):
+        if entry.kind in (COROUTINE_FUNCTION, ASYNC_GENERATOR_FUNCTION):
+            self.invoke_on_event_loop(context, entry, args, kwargs)
+        elif entry.executor == EXECUTOR_THREAD:
+            self.invoke_on_worker_thread(context, entry, args, kwargs)
+        elif entry.executor == EXECUTOR_UI: # queued even from a slot, which returns first
+            asyncqt_ui_thread_loop.post(self._invoke_call, context, entry, args, kwargs)
+        else:
+            self.invoke_on_process_pool(context, entry, args, kwargs)
 
-    @run_on_worker_thread
-    def invoke_on_worker_thread(self, callback_id, function_name, params):
-        result = self.invoke(function_name, params)
-        self.py_reply_message_to_js(callback_id, result)
+    @pyqtSlot(str, name='post_message_batch') # js -> py, many async calls in one crossing
+    def js_post_message_batch_to_py(self, messages):
+        calls, replies, reply_names = [], [], []
+        started = time.perf_counter()
+        try:
+            batch = self._serializer.loads(messages)
+            if not isinstance(batch, list):
+                raise InvalidParamsError("a batch must be an array, got %s" % type(batch).__name__)
+        except Exception as e: # nobody can be answered without the callback ids, an exception escaping a slot aborts the application
+            logger.warning("batch rejected: %s", e)
+            self._metrics.count_error(UNKNOWN_FUNCTION)
+            return
+        parse_ms = (time.perf_counter() - started) * 1000 / max(1, len(batch)) # shared by the calls of the batch
+        request_bytes = len(messages) // max(1, len(batch))
+        for message in batch:
+            callback_id = message.get("callback_id") if isinstance(message, dict) else None
+            if callback_id is None:
+                logger.warning("batch call without callback_id dropped: %r", message)
+                self._metrics.count_error(UNKNOWN_FUNCTION)
+                continue
+            callback_id = str(callback_id)
+            try:
+                entry = self._dispatch_table.get(message.get("method"))
+            except Exception as e: # unknown or missing method, only this call is rejected
+                logger.warning("batch call %s rejected: %s", message.get("method"), e)
+                replies.append(self._make_error_reply(callback_id, FunctionNotFoundError("function %s is not bound" % message.get("method"))))
+                reply_names.append(UNKNOWN_FUNCTION)
+                self._metrics.count_error(UNKNOWN_FUNCTION)
+                continue
+            context = CallContext(callback_id, entry.name)
+            self._add_call(context)
+            calls.append((context, entry, message.get("params")))
+        if replies:
+            self.py_reply_batch_to_js(replies, reply_names)
+        if calls: # their params are bound off the UI thread, the part of a batch which grows with it
+            self.invoke_batch_on_worker_thread(calls, request_bytes, parse_ms)
+
+    @pyqtSlot(str, name='cancel') # js -> py, js timed out, aborted the call or stopped iterating a stream
+    def js_cancel(self, callback_id):
+        with self._calls_lock:
+            context = self._calls.pop(callback_id, None)
+        if context and not self._leave_flight(context):
+            context.cancel()
+        stream = self._streams.get(callback_id)
+        if stream:
+            stream.cancel()
+
+    @pyqtSlot(str, name='connect_page') # js -> py, the first message of every page load, before its calls
+    def js_connect_page(self, page_id):
+        if page_id == self._page_id:
+            return
+        if self._page_id is not None: # a new page, nobody is left to receive the results of the old one
+            self.cancel_all_calls()
+            self.clear_subscriptions() # it announces its own topics right after
+        self._page_id = page_id
+
+    def cancel_all_calls(self):
+        with self._calls_lock:
+            calls, self._calls = self._calls, {}
+        with self._flights_lock:
+            self._flights = {}
+        for context in calls.values():
+            context.cancel()
+        for stream in list(self._streams.values()):
+            stream.cancel()
+
+    def _add_call(self, context):
+        with self._calls_lock:
+            self._calls[context.callback_id] = context
+
+    def _take_call(self, context) -> bool:
+        """ True if js still waits for the reply of this call. """
+        with self._calls_lock:
+            if self._calls.get(context.callback_id) is not context:
+                return False # cancelled, or the page was reloaded and reuses the callback id
+            del self._calls[context.callback_id]
+        return not context.cancelled
+
+    def _finish_call(self, context, result, error=None):
+        waiters = [context]
+        if context.flight_key is not None:
+            with self._flights_lock:
+                if self._flights.get(context.flight_key, waiters)[0] is context:
+                    waiters = self._flights.pop(context.flight_key, waiters) # later calls start a new flight
+        if error is not None:
+            self._metrics.count_error(context.function_name)
+        encoded = None # unknown until a reply is serialized
+        for waiter in waiters:
+            if not self._take_call(waiter):
+                continue
+            if error is not None:
+                self.py_reply_error_to_js(waiter.callback_id, error, context.function_name)
+            else:
+                encoded = self.py_reply_message_to_js(waiter.callback_id, result, context.function_name) and encoded is not False
+        if error is None and context.cache is not None: # even if js gave up waiting, the next call hits
+            if encoded is None:
+                encoded = self._is_encodable(result)
+            if encoded: # a result js can not receive is not kept either
+                cache, key, generation = context.cache
+                cache.put(key, result, generation)
+
+    def invoke_on_worker_thread(self, context, entry, args, kwargs):
+        if entry.serial_key is None:
+            asyncqt_worker_thread_executor.execute_with_priority(entry.priority, self._invoke_call, context, entry, args, kwargs)
+            return
+        try:
+            key = entry.serial_key_of(args, kwargs)
+            hash(key) # e.g. a js array, rejected here rather than escaping the slot
+            asyncqt_keyed_serial_executor.execute_with_priority(entry.priority, key, self._invoke_call, context, entry, args, kwargs)
+        except Exception as e:
+            logger.exception("call %s failed: %s", context.function_name, e)
+            self._finish_call(context, None, InvalidParamsError("serial key of %s(): %s" % (entry.name, e)))
+
+    def _invoke_call(self, context, entry, args, kwargs):
+        if context.cancelled: # dropped while it was queued
+            return
+        started = time.perf_counter()
+        self._metrics.observe(entry.name, "queue", (started - context.created_at) * 1000)
+        token = set_current_call(context)
+        try:
+            result, error = self._call_function(entry, args, kwargs), None
+        except Exception as e:
+            logger.exception("call %s failed: %s", context.function_name, e)
+            result, error = None, e
+        finally:
+            reset_current_call(token)
+            self._metrics.observe(entry.name, "run", (time.perf_counter() - started) * 1000)
+        self._finish_call(context, result, error)
+
+    def invoke_on_event_loop(self, context, entry, args, kwargs):
+        try:
+            coro = entry.function(*args, **kwargs)
+            if inspect.isasyncgen(coro):
+                coro = _collect_async_generator(coro)
+            context.future = run_coroutine(_run_in_call_context(context, coro, self._metrics))
+        except Exception as e:
+            logger.exception("call %s failed: %s", context.function_name, e)
+            self._finish_call(context, None, e)
+            return
+        self._finish_call_when_done(context) # no thread is held while the coroutine awaits
+
+    def invoke_on_process_pool(self, context, entry, args, kwargs):
+        try:
+            context.future = asyncqt_process_executor.submit(entry.function, *args, **kwargs)
+        except Exception as e:
+            logger.exception("call %s failed: %s", context.function_name, e)
+            self._finish_call(context, None, e)
+            return
+        context.future.add_done_callback(lambda future: self._metrics.observe( # queue and run are not told apart
+            entry.name, "run", (time.perf_counter() - context.created_at) * 1000))
+        self._finish_call_when_done(context)
+
+    def _finish_call_when_done(self, context):
+        if context.cancelled: # cancelled before the future was attached
+            context.future.cancel()
+
+        def on_done(future):
+            if future.cancelled():
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.exception("call %s failed: %s", context.function_name, e)
+                self._finish_call(context, None, e)
+                return
+            self._finish_call(context, result)
+        context.future.add_done_callback(on_done)
+
+    @pyqtSlot(str, str, str, name='post_stream') # js -> py, streamed call of a generator function
+    def js_post_stream_to_py(self, callback_id, function_name, params):
+        stream = Stream(callback_id, self.py_send_stream_message_to_js)
+        try:
+            entry, args, kwargs = self._prepare_call(function_name, self._serializer.loads(params) if params else None)
+            if entry.kind not in (GENERATOR_FUNCTION, ASYNC_GENERATOR_FUNCTION): # never called, it would run right here on the UI thread
+                raise RPCError("%s() is not a generator function, it can not be streamed" % entry.name)
+            generator = entry.function(*args, **kwargs) # only creates the generator, its body runs on the worker or the loop
+            self._streams[callback_id] = stream
+            if entry.kind == ASYNC_GENERATOR_FUNCTION:
+                run_coroutine(self._run_stream_async(stream, generator))
+            else:
+                asyncqt_worker_thread_executor.execute_with_priority(entry.priority, self._run_stream, stream, generator)
+        except Exception as e:
+            stream.fail(e)
+
+    @pyqtSlot(str, int, name='stream_credit') # js -> py, js consumed chunks and grants new credits
+    def js_stream_credit(self, callback_id, credits):
+        stream = self._streams.get(callback_id)
+        if stream:
+            stream.grant(credits)
+
+    def _finish_stream(self, stream):
+        if self._streams.get(stream.stream_id) is stream:
+            del self._streams[stream.stream_id]
+
+    def _run_stream(self, stream, generator):
+        try:
+            stream.run(generator)
+        finally:
+            self._finish_stream(stream)
 
-    def py_reply_message_to_js(self, callback_id, result):
-        self.on_message.emit(json.dumps({ "callback_id": callback_id, "result": result}))
+    async def _run_stream_async(self, stream, async_generator):
+        try:
+            await stream.run_async(async_generator)
+        finally:
+            self._finish_stream(stream)
+
+    @pyqtSlot(str, name='report_startup_metrics') # js -> py, page boot timings after the first async call
+    def js_report_startup_metrics(self, metrics):
+        self._startup_metrics = self._serializer.loads(metrics)
+        logger.info("startup metrics %s", self._startup_metrics)
+        self.on_startup_metrics.emit(self._startup_metrics)
+
+    def get_startup_metrics(self):
+        return self._startup_metrics
+
+    def py_send_stream_message_to_js(self, message):
+        self.on_message.emit(self._serializer.dumps(message))
+
+    @run_on_worker_thread(priority=PRIORITY_INTERACTIVE)
+    def invoke_batch_on_worker_thread(self, calls, request_bytes, parse_ms):
+        """ Bind the calls of a batch, answer the rejected and cached ones, run the interactive ones right here and dispatch the others. """
+        replies, reply_names, results = [], [], [] # results: (context, result, sent) of the cached functions
+        for context, entry, params in calls:
+            if context.cancelled:
+                continue
+            try:
+                args, kwargs = entry.bind(params)
+            except Exception as e:
+                logger.warning("batch call %s rejected: %s", entry.name, e)
+                self._metrics.count_error(entry.name)
+                if self._take_call(context):
+                    replies.append(self._make_error_reply(context.callback_id, e))
+                    reply_names.append(entry.name)
+                continue
+            self._metrics.count_call(entry.name, request_bytes, parse_ms)
+            if entry.cache is not None:
+                key = entry.cache.make_key(args, kwargs)
+                generation = entry.cache.generation()
+                result = entry.cache.get(key)
+                if not ResultCache.is_miss(result):
+                    if self._take_call(context):
+                        replies.append(self._make_reply(context.callback_id, result))
+                        reply_names.append(entry.name)
+                    continue
+                context.cache = (entry.cache, key, generation)
+            if entry.single_flight:
+                if not self._join_flight(context, entry, args, kwargs):
+                    self._dispatch_call(context, entry, args, kwargs) # the flight fans out its result on its own
+                continue
+            if not (entry.executor == EXECUTOR_THREAD and entry.kind == FUNCTION and entry.priority == PRIORITY_INTERACTIVE and entry.serial_key is None):
+                self._dispatch_call(context, entry, args, kwargs) # keeps its own executor, replies on its own
+                continue
+            started = time.perf_counter()
+            self._metrics.observe(entry.name, "queue", (started - context.created_at) * 1000)
+            token = set_current_call(context)
+            result = _NO_RESULT
+            try:
+                result = self._call_function(entry, args, kwargs)
+                reply = self._make_reply(context.callback_id, result)
+            except Exception as e:
+                logger.exception("batch call %s failed: %s", context.function_name, e)
+                self._metrics.count_error(entry.name)
+                reply = self._make_error_reply(context.callback_id, e)
+            finally:
+                reset_current_call(token)
+                self._metrics.observe(entry.name, "run", (time.perf_counter() - started) * 1000)
+            sent = self._take_call(context)
+            if sent:
+                replies.append(reply)
+                reply_names.append(entry.name)
+            if context.cache is not None and result is not _NO_RESULT and "error" not in reply:
+                results.append((context, result, sent))
+        failed = self.py_reply_batch_to_js(replies, reply_names) if replies else set()
+        for context, result, sent in results: # cached once they are known to serialize
+            encoded = context.callback_id not in failed if sent else self._is_encodable(result)
+            if encoded:
+                cache, key, generation = context.cache
+                cache.put(key, result, generation)
+
+    def _make_reply(self, callback_id, result):
+        if is_binary(result): # js fetches it as an ArrayBuffer, no base64 or JSON
+            return { "callback_id": callback_id, "blob": blob_store.put(result)}
+        if isinstance(result, Table): # js views the numeric columns of one blob as typed arrays
+            buffer, columns = result.pack()
+            return { "callback_id": callback_id, "table": { "blob": blob_store.put(buffer) if buffer is not None else None, "columns": columns}}
+        return { "callback_id": callback_id, "result": result}
+
+    def _make_error_reply(self, callback_id, error):
+        return { "callback_id": callback_id, "error": error_to_dict(error)}
+
+    def py_reply_message_to_js(self, callback_id, result, function_name=None) -> bool:
+        """ False if the result could not be sent, js then receives an error reply instead. """
+        try:
+            reply = self._make_reply(callback_id, result)
+        except Exception as e: # e.g. a Table with a ragged column
+            reply = self._make_unencodable_reply(callback_id, function_name, e)
+            self._emit_reply(reply, (function_name,))
+            return False
+        return not self._emit_reply(reply, (function_name,))
+
+    def py_reply_error_to_js(self, callback_id, error, function_name=None):
+        self._emit_reply(self._make_error_reply(callback_id, error), (function_name,))
+
+    def py_reply_batch_to_js(self, replies, function_names=()) -> set:
+        """ :return: callback ids of the results which could not be sent, they got an error reply instead """
+        return self._emit_reply({ "batch": replies }, function_names)
+
+    def _make_unencodable_reply(self, callback_id, function_name, error):
+        logger.error("result of call %s(%s) can not be serialized: %s", function_name, callback_id, error)
+        if function_name is not None:
+            self._metrics.count_error(function_name)
+        return self._make_error_reply(callback_id, RPCError("the result of %s() can not be serialized: %s" % (function_name, error)))
+
+    def _is_encodable(self, result) -> bool:
+        if is_binary(result) or isinstance(result, Table):
+            return True
+        try:
+            self._serializer.dumps(result)
+            return True
+        except Exception:
+            return False
+
+    def _emit_reply(self, reply, function_names) -> set:
+        """ :return: callback ids whose reply could not be serialized and was replaced by an error reply """
+        started = time.perf_counter()
+        failed = set()
+        try:
+            text = self._serializer.dumps(reply)
+        except Exception: # one bad result must not cost the other replies of a batch theirs, nor leave js waiting
+            items = reply["batch"] if "batch" in reply else [reply]
+            names = list(function_names) if len(function_names) == len(items) else [None] * len(items)
+            for index, item in enumerate(items):
+                try:
+                    self._serializer.dumps(item)
+                except Exception as e:
+                    failed.add(item["callback_id"])
+                    items[index] = self._make_unencodable_reply(item["callback_id"], names[index], e)
+            text = self._serializer.dumps({ "batch": items } if "batch" in reply else items[0])
+        if function_names and function_names[0] is not None: # encoding a batch is shared by its calls
+            encode_ms = (time.perf_counter() - started) * 1000 / len(function_names)
+            for function_name in function_names:
+                self._metrics.count_reply(function_name, len(text) // len(function_names), encode_ms)
+        self.on_message.emit(text)
+        return failed
+
+    @pyqtSlot(name='get_bridge_stats', result=str) # js -> py
+    def js_get_bridge_stats(self):
+        return self._serializer.dumps(self._metrics.get_stats())
+
+    @pyqtSlot(str, name='report_js_stats') # js -> py, histograms of the phases measured by js since its last report
+    def js_report_js_stats(self, stats):
+        for function_name, phases in self._serializer.loads(stats).items():
+            function_name = self._metric_name(function_name)
+            for phase, histogram in phases.items():
+                try:
+                    self._metrics.merge(function_name, phase, histogram["counts"], histogram["sum"], histogram["max"])
+                except Exception as e:
+                    logger.warning("invalid js stats of %s: %s", function_name, e)
+
+    def _metric_name(self, function_name) -> str:
+        """ Label of a method name sent by js: "#<id>" -> its name, names that are not bound share one label. """
+        if isinstance(function_name, str) and function_name in self._dispatch_table:
+            return self._dispatch_table.get(function_name).name
+        return UNKNOWN_FUNCTION
+
+    def get_metrics(self) -> BridgeMetrics:
+        return self._metrics
+
+    @pyqtSlot(str, name='subscribe') # js -> py, the first listener of a topic
+    def js_subscribe(self, topic):
+        self._topics.add(topic)
+
+    @pyqtSlot(str, name='unsubscribe') # js -> py, the last listener of a topic is gone
+    def js_unsubscribe(self, topic):
+        self._topics.discard(topic)
+
+    def clear_subscriptions(self):
+        self._topics = set()
+
+    def has_subscribers(self, topic) -> bool:
+        return topic in self._topics
+
+    def publish(self, topic, data, key=None) -> bool:
+        if topic not in self._topics: # nobody listens, skip serialization
+            return False
+        if self._message_queue:
+            self._message_queue.put({ "topic": topic, "data": data}, (topic, key) if key is not None else None)
+        else:
+            self.on_message.emit(self._serializer.dumps({ "topic": topic, "data": data}))
+        return True
 
-    def send_message(self, msg):
+    def send_message(self, msg, key=None):
         #print("window python send message to js: %s" % str(msg))
-        self.on_message.emit(json.dumps({ "callback_id": -1, "result": msg}))
+        if self._message_queue:
+            self._message_queue.put({ "callback_id": -1, "result": msg}, key)
+        else:
+            self.on_message.emit(self._serializer.dumps({ "callback_id": -1, "result": msg}))
+
+    def set_serializer(self, serializer):
+        self._serializer = get_serializer(serializer)
+
+    def get_serializer(self) -> Serializer:
+        return self._serializer
+
+    def set_message_queue(self, message_queue):
+        old_message_queue = self._message_queue
+        self._message_queue = message_queue
+        if old_message_queue:
+            old_message_queue.flush()
+
+    def get_message_queue(self):
+        return self._message_queue
+
+    def py_send_messages_to_js(self, messages):
+        if len(messages) == 1:
+            self.on_message.emit(self._serializer.dumps(messages[0]))
+        else:
+            self.on_message.emit(self._serializer.dumps({ "batch": messages }))
+
+
+async def _collect_async_generator(async_generator):
+    return [chunk async for chunk in async_generator]
+
+
+async def _run_in_call_context(context, coro, metrics):
+    set_current_call(context) # the task runs in its own copy of the context, no need to reset
+    started = time.perf_counter()
+    metrics.observe(context.function_name, "queue", (started - context.created_at) * 1000)
+    try:
+        return await coro
+    finally:
+        metrics.observe(context.function_name, "run", (time.perf_counter() - started) * 1000)
 
 
 class WebViewEvent(object):
@@ -229,7 +818,7 @@ class BrowserWindow(object):
             self._main_window.setStatusBar(None)
 
     def _setup_web_engine_view(self) -> NoReturn:
-        self.webview = WebView(self._main_window, "webEngineView", self._configs['dev_mode'])
+        self.webview = WebView(self._main_window, "webEngineView", self._configs['dev_mode'], self._configs['serializer'])
         self._widget_ui.verticalLayout.addWidget(self.webview.get_widget_view())
         if self._configs['dev_mode']:
             self._devtools_web_view = WebView(self._main_window, "webDevEngineView", False)
@@ -239,6 +828,8 @@ class BrowserWindow(object):
             self._setup_shortcut_keys()  # 注册F5,F12等事件
         else:
             self._widget_ui.consoleLogDockWidget.setVisible(False)
+        if self._configs['message_queue']:
+            self.webview.enable_message_queue(**self._configs['message_queue'])
 
     def set_style_sheet(self,  style_sheet_dir) -> NoReturn:
         self._main_window.setStyleSheet(style_sheet_dir)
@@ -342,10 +933,11 @@ class BrowserWindow(object):
 
 class WebView(object):
 
-    def __init__(self, parent, object_name, dev_mode: bool):
+    def __init__(self, parent, object_name, dev_mode: bool, serializer=None):
         self._event_listeners = {}
         self._web_engine_view = None
         self._dev_mode = dev_mode
+        self._serializer = serializer
         self._object_name = object_name
         self._setup_web_engine_view(parent)
         self.move_window_func = None
@@ -363,8 +955,10 @@ class WebView(object):
         # web channel
         self._web_channel = QWebChannel(self._web_engine_view.page())
         self._web_engine_view.page().setWebChannel(self._web_channel)
-        self._web_bridge = WebViewBridge(self)
+        self._web_bridge = WebViewBridge(self, self._serializer)
         self._web_channel.registerObject("proxy", self._web_bridge)
+        self._web_bridge.on_startup_metrics.connect(self._on_startup_metrics)
+        install_blob_scheme_handler(self._web_engine_view.page().profile())
 
         # inject scripts
         self.inject_javascript_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "res", "js", "qwebchannel.js"))
@@ -401,13 +995,20 @@ class WebView(object):
                 listener(event)
 
     def _on_url_changed(self, qurl):
-        logger.info("_on_url_changed %s", qurl.toString())
+        logger.info("_on_url_changed %s", qurl.toString()) # same-document navigations too, the page keeps its calls
         self._notify_event_listeners(WebViewEvent("on_url_changed", qurl.toString()))
 
     def _on_page_load_finished(self, ok):
         logger.info("_on_page_load_finished %s", ok)
         self._notify_event_listeners(WebViewEvent("on_page_load_finished", ok))
 
+    def _on_startup_metrics(self, metrics):
+        self._notify_event_listeners(WebViewEvent("on_startup_metrics", metrics))
+
+    def get_startup_metrics(self) -> dict:
+        """ channelConnectMs, firstRpcLatencyMs and friends of the current page, None until its first async call returns. """
+        return self._web_bridge.get_startup_metrics()
+
     def _on_cookie_added(self, cookie):
         logger.info("_on_cookie_added %s", cookie)
         self._cookiesJar.add_cookie(cookie)
@@ -447,13 +1048,94 @@ class WebView(object):
                 "files": files,
                 "pos": [pos.x(), pos.y()]
             }
-            self.send_message_to_js({"type": "onDrop", "event": event})
-
-    def bind_function(self, js_function_name: str, py_function: Callable) -> NoReturn:
-        self._web_bridge.bind_function(js_function_name, py_function)
-
-    def send_message_to_js(self, msg: Any) -> NoReturn:
-        self._web_bridge.send_message(msg)
+            self.publish(DROP_TOPIC, event) # DragAndDropHelper of mmgui.js
+
+    def bind_function(self, js_function_name: str, py_function: Callable, coerce: bool = False, executor: str = "thread",
+                      cache: Any = None, single_flight: bool = False, priority: str = "interactive", serial_key: Any = None) -> int:
+        """
+        Bind a python function to js, its signature is checked once here and every js call is validated against it.
+        :param coerce: convert params to the int/float/str/bool annotations of the function
+        :param executor: where async calls run, "thread" (worker thread pool), "ui" (Qt main thread),
+                         or "process" (process pool, for CPU-bound picklable functions), other names raise ValueError.
+                         Process workers are spawned and import the main module again, so the script must start the app
+                         under `if __name__ == "__main__":` and the function must be importable, not a lambda or a closure
+        :param cache: memoize results of a pure function, True, a dict like {"max_size": 128, "ttl": 60, "key": fn}
+                      or a ResultCache, hits are answered without a worker thread hop. See `invalidate()`
+        :param single_flight: identical calls (same function and params) made while one is running share its execution
+                              and result, js dedupes them before they cross the bridge too
+        :param priority: worker thread lane of the calls, "interactive" (default), "normal" or "background"
+        :param serial_key: a param name or fn(*args, **kwargs), calls with the same key run one at a time in order and
+                           the others in parallel, e.g. serial_key="doc_id". Keys are shared by all bound functions,
+                           serial_key=lambda *args, **kwargs: "db" runs every call of the function in one queue
+        :return: id of the function, js can call it by `"#" + id` as well
+        """
+        return self._web_bridge.bind_function(js_function_name, py_function, coerce, executor, cache, single_flight, priority, serial_key)
+
+    def invalidate(self, js_function_name: str, params: Any = None) -> NoReturn:
+        """
+        Drop cached results of a function bound with `cache`.
+        :param params: params of the result to drop (an object or an array, like js sends them), None drops them all
+        """
+        self._web_bridge.invalidate(js_function_name, params)
+
+    def get_cache_stats(self, js_function_name: str) -> dict:
+        """ hits, misses, evictions, expirations and size of the result cache, None if the function is not cached """
+        return self._web_bridge.get_cache_stats(js_function_name)
+
+    def unbind_function(self, js_function_name: str) -> NoReturn:
+        self._web_bridge.unbind_function(js_function_name)
+
+    def publish(self, topic: str, data: Any, key: Any = None) -> bool:
+        """
+        Send data to the js listeners of a topic (`RPC.subscribe(topic, listener)`), other pages are not woken up.
+        :param key: with the message queue enabled, pending messages of the topic with the same key are coalesced
+        :return: False if the page has no listener of the topic, data is not even serialized then
+        """
+        return self._web_bridge.publish(topic, data, key)
+
+    def has_subscribers(self, topic: str) -> bool:
+        return self._web_bridge.has_subscribers(topic)
+
+    def create_stream(self, name: str, max_rate_hz: float = 30, mode: str = "latest", aggregate: Any = "append",
+                      sample_size: int = 100) -> EventStream:
+        """
+        Rate limited event stream published to the topic `name`, push() it from any thread as often as needed.
+        :param mode: "latest" sends the last value, "aggregate" reduces the values of a frame with `aggregate`,
+                     "sample" sends a random sample of at most `sample_size` values
+        :param aggregate: "append" (list), "last", "stats" ({count, min, max, mean}) or a reducer fn(acc, value) -> acc
+        """
+        return EventStream(self, name, max_rate_hz, mode, aggregate, sample_size)
+
+    def send_message_to_js(self, msg: Any, key: Any = None) -> NoReturn:
+        """
+        Send a broadcast message to js, it can be called from any thread.
+        When the message queue is enabled, a message with a `key` replaces the pending message with the same key.
+        """
+        self._web_bridge.send_message(msg, key)
+
+    def enable_message_queue(self, interval: int = 0, max_size: int = 10000, policy: str = "drop") -> NoReturn:
+        self._web_bridge.set_message_queue(MessageQueue(self._web_bridge.py_send_messages_to_js, interval, max_size, policy))
+
+    def disable_message_queue(self) -> NoReturn:
+        self._web_bridge.set_message_queue(None)
+
+    def get_message_queue_stats(self) -> dict:
+        message_queue = self._web_bridge.get_message_queue()
+        return message_queue.get_stats() if message_queue else None
+
+    def get_bridge_stats(self) -> dict:
+        """
+        Per function: calls, errors, payload bytes and latency percentiles (ms) of each phase,
+        parse/queue/run/encode measured by python, roundtrip/js_parse reported by js every few seconds.
+        """
+        return self._web_bridge.get_metrics().get_stats()
+
+    def get_bridge_metrics_text(self) -> str:
+        """ The bridge stats in Prometheus text format, to be served to a scraper. """
+        return self._web_bridge.get_metrics().to_prometheus()
+
+    def reset_bridge_stats(self) -> NoReturn:
+        self._web_bridge.get_metrics().reset()
 
     def run_javascript_code(self, javascript_code: str, callback: Callable[[Any], None]) -> NoReturn:
         self._web_engine_view.page().runJavaScript(javascript_code, callback)
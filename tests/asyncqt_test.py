@@ -0,0 +1,230 @@
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+from mmgui.asyncqt import SerialExecutor, KeyedSerialExecutor, WorkerThreadExecutor, QtEventLoop, UIThreadLoop, asyncqt_worker_thread_executor, asyncqt_ui_thread_loop, \
+    to_worker, to_ui, gather, run_on_worker_thread, run_on_ui_thread, run_on_ui_thread_debounced, run_on_ui_thread_throttled, \
+    PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND
+
+
+def test_serial_executor_keeps_order():
+    executor = SerialExecutor("test", asyncqt_worker_thread_executor)
+    order = []
+    done = threading.Event()
+
+    def step(i):
+        time.sleep(0.01 * (5 - i)) # later tasks are faster, they would overtake on a plain pool
+        order.append(i)
+        if i == 4:
+            done.set()
+
+    for i in range(5):
+        executor.execute(step, i)
+    assert done.wait(5)
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_keyed_serial_executor():
+    executor = KeyedSerialExecutor(WorkerThreadExecutor(max_threads=4))
+    order = {"a": [], "b": []}
+    running = {"a": 0, "b": 0}
+    overlaps = []
+    done = threading.Event()
+
+    def step(key, i):
+        running[key] += 1
+        overlaps.append(running[key] > 1)
+        time.sleep(0.01 * (5 - i))
+        order[key].append(i)
+        running[key] -= 1
+        if len(order["a"]) + len(order["b"]) == 10:
+            done.set()
+
+    started = time.monotonic()
+    for i in range(5):
+        executor.execute("a", step, "a", i)
+        executor.execute("b", step, "b", i)
+    assert done.wait(5)
+    assert order == {"a": [0, 1, 2, 3, 4], "b": [0, 1, 2, 3, 4]} and not any(overlaps)
+    assert time.monotonic() - started < 0.25 # both lanes ran in parallel, 0.15s each
+    deadline = time.monotonic() + 1
+    while executor.get_stats()["lanes"] and time.monotonic() < deadline: # the last task is still being popped
+        time.sleep(0.001)
+    assert executor.get_stats() == {"lanes": 0, "queued": 0}
+
+
+def test_priority_lanes():
+    executor = WorkerThreadExecutor(max_threads=1) # queue everything behind one blocked thread
+    blocker, done = threading.Event(), threading.Event()
+    order = []
+    executor.execute(blocker.wait)
+    time.sleep(0.05)
+    executor.execute_with_priority(PRIORITY_BACKGROUND, order.append, "background")
+    executor.execute_with_priority(PRIORITY_NORMAL, order.append, "normal")
+    executor.execute_with_priority(PRIORITY_INTERACTIVE, order.append, "interactive")
+    executor.execute_with_priority(PRIORITY_BACKGROUND, done.set)
+    assert executor.get_lane_stats()[PRIORITY_BACKGROUND]["queued"] == 2
+    blocker.set()
+    assert done.wait(5)
+    assert order == ["interactive", "normal", "background"]
+    assert executor.get_lane_stats()[PRIORITY_INTERACTIVE]["completed"] == 1
+
+
+def test_adaptive_pool_grows():
+    executor = WorkerThreadExecutor(max_threads=8, min_threads=1, adaptive=True, target_wait_ms=10)
+    blocker = threading.Event()
+    for _ in range(8):
+        executor.execute(blocker.wait)
+        time.sleep(0.1)
+    stats = executor.get_stats()
+    blocker.set()
+    assert stats["max_threads"] > 1
+    assert stats["active_threads"] > 1
+
+
+def test_worker_thread_futures():
+    @run_on_worker_thread
+    def square(x):
+        time.sleep(0.01 * (5 - x))
+        if x < 0:
+            raise ValueError("negative %s" % x)
+        return x * x
+
+    assert gather(*[square(i) for i in range(5)]).result(5) == [0, 1, 4, 9, 16]
+    assert square(3).then(lambda x: x + 1).result(5) == 10
+    failed = gather(square(1), square(-1))
+    with pytest.raises(ValueError):
+        failed.result(5)
+    results = gather(square(2), square(-2).then(lambda x: x + 1), return_exceptions=True).result(5)
+    assert results[0] == 4 and isinstance(results[1], ValueError)
+
+
+def test_done_callback_on_ui_thread(qtbot):
+    asyncqt_ui_thread_loop.start_loop()
+    threads = []
+
+    @run_on_ui_thread
+    def on_ui():
+        return threading.current_thread() is threading.main_thread()
+
+    @run_on_worker_thread
+    def work():
+        return 1
+
+    work().add_done_callback(lambda future: threads.append(threading.current_thread() is threading.main_thread()), on_ui_thread=True)
+    qtbot.waitUntil(lambda: len(threads) == 1)
+    assert threads == [True]
+    assert on_ui().result(1) is True # emitted on the UI thread, the signal calls it right away
+
+
+def test_ui_thread_loop_drains_in_batches(qtbot):
+    loop = UIThreadLoop(time_budget_ms=5)
+    loop.start_loop()
+    calls = []
+
+    def producer():
+        for i in range(1000):
+            loop.run_on_ui_thread(calls.append, i)
+        loop.run_on_ui_thread(time.sleep, 0.01) # blows the budget, the rest waits for the next drain
+        for i in range(1000, 1010):
+            loop.run_on_ui_thread(calls.append, i)
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    thread.join()
+    qtbot.waitUntil(lambda: len(calls) == 1010)
+    stats = loop.get_stats()
+    assert calls == list(range(1010))
+    assert stats["drained"] == 1011 and stats["depth"] == 0
+    assert stats["drains"] < 1011 / 10 and stats["over_budget"] >= 1
+    assert stats["drain_latency_ms"]["count"] == stats["drains"]
+
+
+def _call_from_worker(func, calls, interval=0.0):
+    def producer():
+        for i in range(calls):
+            func(i)
+            time.sleep(interval)
+    thread = threading.Thread(target=producer)
+    thread.start() # not joined, the UI thread keeps running the calls
+    return thread
+
+
+def test_debounced_and_throttled(qtbot):
+    asyncqt_ui_thread_loop.start_loop()
+    debounced_calls, throttled_calls = [], []
+
+    @run_on_ui_thread_debounced(0.05)
+    def debounced(i):
+        debounced_calls.append(i)
+
+    @run_on_ui_thread_throttled(20)
+    def throttled(i):
+        throttled_calls.append(i)
+
+    threads = [_call_from_worker(debounced, 100, 0.001), _call_from_worker(throttled, 100, 0.002)]
+    qtbot.waitUntil(lambda: debounced_calls == [99] and throttled_calls[-1:] == [99])
+    for thread in threads:
+        thread.join()
+    assert throttled_calls[0] == 0 and len(throttled_calls) < 10
+    stats = throttled.get_stats()
+    assert stats["calls"] == 100 and stats["saved"] == 100 - len(throttled_calls)
+
+
+def test_coalesce_key(qtbot):
+    asyncqt_ui_thread_loop.start_loop()
+    rows = {}
+
+    @run_on_ui_thread(coalesce_key=lambda row, value: row)
+    def update_row(row, value):
+        rows.setdefault(row, []).append(value)
+
+    def producer():
+        futures = [update_row(i % 3, i) for i in range(30)]
+        return futures
+
+    futures = []
+    thread = threading.Thread(target=lambda: futures.extend(producer()))
+    thread.start()
+    thread.join()
+    qtbot.waitUntil(lambda: all(future.done() for future in futures))
+    assert {row: values[-1] for row, values in rows.items()} == {0: 27, 1: 28, 2: 29}
+    assert update_row.get_stats()["saved"] == 30 - sum(len(values) for values in rows.values())
+
+
+def test_qt_event_loop(qtbot):
+    asyncqt_ui_thread_loop.start_loop()
+    hooks = sys.get_asyncgen_hooks()
+    loop = QtEventLoop()
+    loop.start()
+    results = []
+
+    async def echo(reader, writer):
+        writer.write(await reader.readline())
+        await writer.drain()
+        writer.close()
+
+    async def main():
+        await asyncio.sleep(0.01)
+        results.append(await to_worker(lambda: threading.current_thread() is threading.main_thread()))
+        results.append(await to_ui(lambda: threading.current_thread() is threading.main_thread()))
+        server = await asyncio.start_server(echo, "127.0.0.1", 0) # socket IO wakes the loop up through Qt
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(b"ping\n")
+        results.append(await reader.readline())
+        writer.close()
+        server.close()
+
+    try: # a failure must not leave the loop running as the current one, nor its asyncgen hooks installed
+        task = loop.create_task(main())
+        qtbot.waitUntil(task.done, timeout=5000)
+        task.result()
+        assert results == [False, True, b"ping\n"]
+        pending = loop.create_task(asyncio.sleep(100))
+    finally:
+        loop.finish()
+    assert pending.cancelled() and loop.is_closed()
+    assert sys.get_asyncgen_hooks() == hooks
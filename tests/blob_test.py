@@ -0,0 +1,19 @@
+import pytest
+
+from mmgui.blob import Blob, BlobStore, is_binary
+
+
+def test_is_binary():
+    assert is_binary(b"a") and is_binary(bytearray(b"a")) and is_binary(memoryview(b"a"))
+    assert not is_binary("a") and not is_binary([1]) and not is_binary(None)
+    numpy = pytest.importorskip("numpy")
+    assert not is_binary(numpy.arange(3)) and not is_binary(numpy.float64(1)) # serialized as JSON, unless wrapped
+    assert is_binary(Blob(numpy.arange(3)))
+
+
+def test_put_blob():
+    store = BlobStore()
+    url = store.put(Blob(bytearray(b"abc")))
+    assert store.take(url.split("://")[1]).tobytes() == b"abc"
+    with pytest.raises(TypeError):
+        Blob("abc")
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from mmgui.cache import ResultCache, make_result_cache
+
+
+def test_hit_and_miss():
+    cache = ResultCache()
+    key = cache.make_key((), {"b": 2, "a": 1})
+    assert key == cache.make_key((), {"a": 1, "b": 2})
+    assert ResultCache.is_miss(cache.get(key))
+    cache.put(key, [1, 2])
+    assert cache.get(key) == [1, 2]
+    cache.put("none", None)
+    assert cache.get("none") is None and not ResultCache.is_miss(cache.get("none"))
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (3, 1, 2)
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert ResultCache.is_miss(cache.get("b"))
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_ttl():
+    cache = ResultCache(ttl=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert ResultCache.is_miss(cache.get("a"))
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_invalidate():
+    cache = ResultCache(key=lambda args, kwargs: kwargs["table"])
+    cache.put(cache.make_key((), {"table": "users"}), 1)
+    cache.put(cache.make_key((), {"table": "posts"}), 2)
+    cache.invalidate("users")
+    assert ResultCache.is_miss(cache.get("users")) and cache.get("posts") == 2
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_invalidate_drops_running_results():
+    cache = ResultCache()
+    generation = cache.generation()
+    cache.invalidate("a") # while the call computing "a" was running
+    cache.put("a", 1, generation)
+    assert ResultCache.is_miss(cache.get("a"))
+    cache.put("a", 2, cache.generation())
+    assert cache.get("a") == 2
+
+
+def test_make_result_cache():
+    assert make_result_cache({"max_size": 4}).get_stats()["max_size"] == 4
+    with pytest.raises(Exception):
+        make_result_cache("yes")
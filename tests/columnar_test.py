@@ -0,0 +1,29 @@
+import array
+import struct
+
+import pytest
+
+from mmgui.columnar import Table
+
+
+def test_pack_columns():
+    table = Table({"x": array.array("i", [1, 2, 3]), "y": [0.5, 1.5, 2.5], "label": ["a", "b", "c"]})
+    buffer, columns = table.pack()
+    x, y, label = columns
+    assert x == {"name": "x", "dtype": "int32", "shape": [3], "offset": 0, "length": 12}
+    assert y == {"name": "y", "dtype": "float64", "shape": [3], "offset": 16, "length": 24} # 8-byte aligned
+    assert label == {"name": "label", "values": ["a", "b", "c"]}
+    assert struct.unpack_from("<3i", buffer, 0) == (1, 2, 3)
+    assert struct.unpack_from("<3d", buffer, 16) == (0.5, 1.5, 2.5)
+
+
+def test_pack_without_numeric_columns():
+    assert Table(label=["a"]).pack() == (None, [{"name": "label", "values": ["a"]}])
+
+
+def test_pack_numpy():
+    numpy = pytest.importorskip("numpy")
+    matrix = numpy.arange(6, dtype=">f4").reshape(2, 3).T # big-endian and not contiguous
+    buffer, columns = Table(matrix=matrix).pack()
+    assert columns[0]["dtype"] == "float32" and columns[0]["shape"] == [3, 2]
+    assert numpy.frombuffer(bytes(buffer), dtype="<f4").tolist() == matrix.flatten().tolist()
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from mmgui.asyncqt import asyncqt_ui_thread_loop
+from mmgui.event_stream import EventStream
+
+
+class FakeWebView(object):
+
+    def __init__(self, topics=("sensor",)):
+        self.topics = set(topics)
+        self.published = []
+
+    def has_subscribers(self, topic):
+        return topic in self.topics
+
+    def publish(self, topic, data, key=None):
+        self.published.append(data)
+        return True
+
+
+def test_modes(qtbot):
+    webview = FakeWebView()
+    latest = EventStream(webview, "sensor", mode="latest")
+    stats = EventStream(webview, "sensor", mode="aggregate", aggregate="stats")
+    appended = EventStream(webview, "sensor", mode="aggregate")
+    sampled = EventStream(webview, "sensor", mode="sample", sample_size=3)
+    for stream in (latest, stats, appended, sampled):
+        for value in (4, 1, 7):
+            stream.push(value)
+        stream.flush()
+    sampled.flush() # nothing pushed, nothing sent
+    assert webview.published[:3] == [7, {"count": 3, "min": 1, "max": 7, "mean": 4}, [4, 1, 7]]
+    assert sorted(webview.published[3]) == [1, 4, 7]
+    assert len(webview.published) == 4
+    with pytest.raises(Exception):
+        EventStream(webview, "sensor", mode="aggregate", aggregate="median")
+
+
+def test_dropped_without_subscribers(qtbot):
+    webview = FakeWebView(topics=())
+    stream = EventStream(webview, "sensor")
+    stream.push(1)
+    stream.flush()
+    assert webview.published == []
+    assert stream.get_stats() == {"pushed": 0, "frames": 0, "dropped": 1}
+
+
+def test_rate_limit(qtbot):
+    asyncqt_ui_thread_loop.start_loop()
+    webview = FakeWebView()
+    stream = EventStream(webview, "sensor", max_rate_hz=10, mode="aggregate", aggregate=lambda acc, value: (acc or 0) + value)
+
+    def producer():
+        for i in range(1000):
+            stream.push(1)
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    thread.join()
+    qtbot.waitUntil(lambda: sum(webview.published) == 1000)
+    assert len(webview.published) <= 2 # a first frame right away, the rest at most 100ms later
@@ -0,0 +1,46 @@
+import threading
+
+from mmgui.asyncqt import asyncqt_ui_thread_loop
+from mmgui.message_queue import MessageQueue
+
+
+def test_coalesce_by_key(qtbot):
+    flushed = []
+    queue = MessageQueue(flushed.append)
+    queue.put({"type": "log", "value": 1})
+    queue.put({"type": "progress", "value": 1}, key="progress")
+    queue.put({"type": "progress", "value": 2}, key="progress")
+    queue.put({"type": "log", "value": 2})
+    queue.flush()
+    assert flushed == [[
+        {"type": "log", "value": 1},
+        {"type": "progress", "value": 2},
+        {"type": "log", "value": 2}
+    ]]
+    assert queue.get_stats()["coalesced"] == 1
+
+
+def test_drop_oldest_when_full(qtbot):
+    flushed = []
+    queue = MessageQueue(flushed.append, max_size=3, policy="drop")
+    for i in range(10):
+        queue.put(i)
+    queue.flush()
+    assert flushed == [[7, 8, 9]]
+    assert queue.get_stats()["dropped"] == 7
+
+
+def test_flush_on_ui_thread(qtbot):
+    asyncqt_ui_thread_loop.start_loop()
+    flushed = []
+    queue = MessageQueue(flushed.append, interval=16, max_size=5, policy="block")
+
+    def producer():
+        for i in range(20):
+            queue.put(i)
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    qtbot.waitUntil(lambda: sum(len(messages) for messages in flushed) == 20)
+    thread.join()
+    assert [i for messages in flushed for i in messages] == list(range(20))
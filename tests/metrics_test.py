@@ -0,0 +1,36 @@
+from mmgui.metrics import Histogram, BridgeMetrics, DEFAULT_BUCKETS_MS
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 10, 100))
+    for value in range(1, 101):
+        histogram.observe(value)
+    stats = histogram.get_stats()
+    assert stats["count"] == 100 and stats["max"] == 100 and stats["avg"] == 50.5
+    assert 10 <= stats["p50"] <= 100
+    assert stats["p99"] <= 100
+    assert histogram.buckets() == [(1, 1), (10, 10), (100, 100), (float("inf"), 100)]
+    histogram.observe(1000)
+    assert histogram.percentile(1.0) == 1000
+    histogram.reset()
+    assert histogram.get_stats()["count"] == 0 and histogram.percentile(0.5) == 0.0
+
+
+def test_bridge_metrics():
+    metrics = BridgeMetrics()
+    metrics.count_call("add", 10, 0.2)
+    metrics.observe("add", "run", 3)
+    metrics.count_reply("add", 20, 0.1)
+    metrics.count_error("add")
+    js_counts = [0] * (len(DEFAULT_BUCKETS_MS) + 1)
+    js_counts[DEFAULT_BUCKETS_MS.index(5)] = 1
+    metrics.merge("add", "roundtrip", js_counts, 5, 5)
+    stats = metrics.get_stats()["add"]
+    assert (stats["calls"], stats["errors"], stats["request_bytes"], stats["response_bytes"]) == (1, 1, 10, 20)
+    assert stats["phases"]["roundtrip"]["count"] == 1
+    assert abs(stats["transport_avg_ms"] - 1.7) < 1e-9
+    text = metrics.to_prometheus()
+    assert 'mmgui_bridge_calls_total{function="add"} 1' in text
+    assert 'mmgui_bridge_phase_seconds_bucket{function="add",phase="run",le="0.005"} 1' in text
+    assert 'mmgui_bridge_phase_seconds_count{function="add",phase="roundtrip"} 1' in text
+    assert 'phase="queue"' not in text
@@ -0,0 +1,105 @@
+import pytest
+
+from mmgui.rpc import DispatchTable, FunctionNotFoundError, InvalidParamsError, COROUTINE_FUNCTION, GENERATOR_FUNCTION
+
+
+def add(a, b=1):
+    return a + b
+
+
+def test_bind_by_name_and_id():
+    table = DispatchTable()
+    entry = table.bind("add", add)
+    assert table.get("add") is entry
+    assert table.get("#%d" % entry.id) is entry
+    assert table.describe() == {"add": {"id": entry.id, "kind": "function"}}
+    table.unbind("add")
+    with pytest.raises(FunctionNotFoundError):
+        table.get("add")
+    with pytest.raises(FunctionNotFoundError):
+        table.get("#%d" % entry.id)
+
+
+def test_describe_single_flight():
+    entry = DispatchTable().bind("add", add, single_flight=True)
+    assert entry.describe() == {"id": entry.id, "kind": "function", "single_flight": True}
+
+
+def test_rebind_gets_a_new_id():
+    table = DispatchTable()
+    first = table.bind("add", add)
+    second = table.bind("add", add)
+    assert first.id != second.id
+    assert "#%d" % first.id not in table
+
+
+def test_bind_params():
+    entry = DispatchTable().bind("add", add)
+    assert entry.bind({"a": 1}) == ((), {"a": 1})
+    assert entry.bind([1, 2]) == ((), {"a": 1, "b": 2})
+    with pytest.raises(InvalidParamsError, match="missing required params: a"):
+        entry.bind({"b": 2})
+    with pytest.raises(InvalidParamsError, match="unexpected params: c"):
+        entry.bind({"a": 1, "c": 3})
+    with pytest.raises(InvalidParamsError, match="takes 2 positional params"):
+        entry.bind([1, 2, 3])
+    with pytest.raises(InvalidParamsError):
+        entry.bind("a")
+
+
+def test_var_args():
+    def concat(sep, *parts, **options):
+        return sep.join(parts)
+    entry = DispatchTable().bind("concat", concat)
+    args, kwargs = entry.bind(["-", "a", "b"])
+    assert concat(*args, **kwargs) == "a-b"
+    assert entry.bind({"sep": "-", "upper": True}) == ((), {"sep": "-", "upper": True})
+
+
+def test_positional_only():
+    def scale(a=1, b=2, /):
+        return a * b
+    entry = DispatchTable().bind("scale", scale)
+    assert entry.bind({"a": 3}) == ((3,), {})
+    assert entry.bind({"a": 3, "b": 5}) == ((3, 5), {})
+    with pytest.raises(InvalidParamsError, match="b can not be given without a"):
+        entry.bind({"b": 5}) # would call scale(5)
+
+
+def test_coerce():
+    def page(index: int, size: float = 10.0, desc: bool = False, name: str = ""):
+        return index, size, desc, name
+    entry = DispatchTable().bind("page", page, coerce=True)
+    args, kwargs = entry.bind({"index": "2", "size": "5", "desc": "true", "name": 3})
+    assert page(*args, **kwargs) == (2, 5.0, True, "3")
+    with pytest.raises(InvalidParamsError, match="param index"):
+        entry.bind({"index": "x"})
+    with pytest.raises(InvalidParamsError, match="param index"):
+        entry.bind({"index": 1.5})
+    assert DispatchTable().bind("page", page).bind({"index": "2"}) == ((), {"index": "2"})
+
+
+def test_kind():
+    async def fetch():
+        pass
+
+    def rows():
+        yield 1
+    table = DispatchTable()
+    assert table.bind("fetch", fetch).kind == COROUTINE_FUNCTION
+    assert table.bind("rows", rows).kind == GENERATOR_FUNCTION
+
+
+def test_serial_key():
+    def save(doc_id, text, /, force=False):
+        pass
+    table = DispatchTable()
+    entry = table.bind("save", save, serial_key="force")
+    assert entry.serial_key_of(*entry.bind({"doc_id": 1, "text": "a", "force": True})) is True
+    assert entry.serial_key_of(*entry.bind({"doc_id": 1, "text": "a"})) is False # the default
+    entry = table.bind("save", save, serial_key="doc_id")
+    assert entry.serial_key_of(*entry.bind([7, "a"])) == 7 # positional-only, passed in args
+    entry = table.bind("save", save, serial_key=lambda doc_id, text, force=False: ("doc", doc_id))
+    assert entry.serial_key_of(*entry.bind([7, "a"])) == ("doc", 7)
+    with pytest.raises(Exception, match="not a param"):
+        table.bind("save", save, serial_key="path")
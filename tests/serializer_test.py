@@ -0,0 +1,64 @@
+import datetime
+import decimal
+import uuid
+from dataclasses import dataclass
+
+import pytest
+
+from mmgui.serializer import JsonSerializer, OrjsonSerializer, get_serializer
+
+
+@dataclass
+class Point(object):
+    x: int
+    y: int
+
+
+def _serializers():
+    serializers = [JsonSerializer()]
+    try:
+        serializers.append(OrjsonSerializer())
+    except Exception:
+        pass
+    return serializers
+
+
+@pytest.mark.parametrize("serializer", _serializers(), ids=lambda s: s.name)
+def test_native_types(serializer):
+    text = serializer.dumps({
+        "point": Point(1, 2),
+        "created_at": datetime.datetime(2020, 1, 2, 3, 4, 5),
+        "day": datetime.date(2020, 1, 2),
+        "price": decimal.Decimal("0.10"),
+        "id": uuid.UUID(int=1),
+        "tags": {"a"}
+    })
+    assert serializer.loads(text) == {
+        "point": {"x": 1, "y": 2},
+        "created_at": "2020-01-02T03:04:05",
+        "day": "2020-01-02",
+        "price": "0.10",
+        "id": "00000000-0000-0000-0000-000000000001",
+        "tags": ["a"]
+    }
+
+
+@pytest.mark.parametrize("serializer", _serializers(), ids=lambda s: s.name)
+def test_numpy(serializer):
+    numpy = pytest.importorskip("numpy")
+    text = serializer.dumps({"array": numpy.arange(3), "scalar": numpy.float64(1.5)})
+    assert serializer.loads(text) == {"array": [0, 1, 2], "scalar": 1.5}
+
+
+def test_unsupported_type():
+    with pytest.raises(TypeError):
+        JsonSerializer().dumps(object())
+
+
+def test_get_serializer():
+    assert get_serializer("json").name == "json"
+    assert get_serializer("auto").name in ("json", "orjson")
+    serializer = JsonSerializer()
+    assert get_serializer(serializer) is serializer
+    with pytest.raises(Exception):
+        get_serializer("xml")
@@ -0,0 +1,86 @@
+import pytest
+
+from mmgui.asyncqt import asyncqt_ui_thread_loop
+from mmgui.store import Store, parse_path, format_path
+
+
+class FakeWebView(object):
+
+    def __init__(self):
+        self.functions = {}
+        self.published = []
+
+    def bind_function(self, name, fn):
+        self.functions[name] = fn
+
+    def publish(self, topic, data, key=None):
+        self.published.append((topic, data))
+        return True
+
+
+def test_paths():
+    assert parse_path("") == []
+    assert parse_path("/a~1b/0/c~0d") == ["a/b", "0", "c~d"]
+    assert format_path(["a/b", 0, "c~d"]) == "/a~1b/0/c~0d"
+    with pytest.raises(Exception):
+        parse_path("a/b")
+
+
+def test_patches(qtbot):
+    webview = FakeWebView()
+    store = Store(webview, "app", {"user": None, "jobs": []})
+    store.set("/user", {"name": "a"})
+    store.set(["user", "name"], "b")
+    store.set(["user", "name"], "c")
+    store.append("/jobs", {"id": 1})
+    store.set("/count", 1)
+    store.remove("/jobs/0")
+    store.flush()
+    assert webview.published == [("mmgui.store.app", {"version": 1, "patch": [
+        {"op": "replace", "path": "/user", "value": {"name": "a"}},
+        {"op": "replace", "path": "/user/name", "value": "c"},
+        {"op": "add", "path": "/jobs/-", "value": {"id": 1}},
+        {"op": "add", "path": "/count", "value": 1},
+        {"op": "remove", "path": "/jobs/0"}
+    ]})]
+    assert store.get("/user/name") == "c"
+    assert store.get("/jobs/0", "missing") == "missing"
+    with pytest.raises(Exception):
+        store.remove("/jobs/0")
+
+
+def test_negative_indexes(qtbot):
+    webview = FakeWebView()
+    store = Store(webview, "app", {"jobs": [{"id": 1}, {"id": 2}]})
+    store.set(["jobs", -1, "id"], 3)
+    store.set("/jobs/-2", {"id": 0})
+    store.remove(["jobs", -1])
+    store.flush()
+    assert [op["path"] for op in webview.published[-1][1]["patch"]] == ["/jobs/1/id", "/jobs/0", "/jobs/1"]
+    assert store.get("/jobs") == [{"id": 0}]
+    assert store.get("/jobs/-2", "missing") == "missing"
+    with pytest.raises(Exception):
+        store.set("/jobs/-2", {})
+
+
+def test_snapshot_flushes_pending_patches(qtbot):
+    webview = FakeWebView()
+    store = Store(webview, "app")
+    store.set("/n", 1)
+    snapshot = webview.functions["mmgui.store.app"]()
+    assert snapshot == {"version": 1, "state": {"n": 1}}
+    assert webview.published[-1][1]["version"] == 1
+    store.set("/n", 2)
+    assert snapshot["state"] == {"n": 1} # a copy, serialized later
+    store.flush()
+    assert store.version == 2
+
+
+def test_flush_once_per_tick(qtbot):
+    asyncqt_ui_thread_loop.start_loop()
+    webview = FakeWebView()
+    store = Store(webview, "app")
+    for i in range(10):
+        store.set("/n", i)
+    qtbot.waitUntil(lambda: len(webview.published) == 1)
+    assert webview.published[0][1] == {"version": 1, "patch": [{"op": "add", "path": "/n", "value": 9}]}
@@ -1,4 +1,31 @@
+import json
+import math
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
 from mmgui import WebView, BrowserWindow
+from mmgui.asyncqt import asyncqt_ui_thread_loop, asyncqt_worker_thread_executor, asyncqt_process_executor
+from mmgui.metrics import DEFAULT_BUCKETS_MS
+from mmgui.rpc import CallContext
+from mmgui.webview import WebViewBridge
+
+
+@contextmanager
+def _busy_worker_threads():
+    """ Every worker thread of the pool is blocked until the block exits. """
+    release, started = threading.Event(), threading.Semaphore(0)
+    count = asyncqt_worker_thread_executor.get_stats()["max_threads"]
+    for _ in range(count):
+        asyncqt_worker_thread_executor.execute(lambda: started.release() or release.wait())
+    for _ in range(count):
+        assert started.acquire(timeout=5)
+    try:
+        yield
+    finally:
+        release.set()
 
 
 def test_load_url(qtbot):
@@ -47,6 +74,199 @@ def test_run_javascript_code(qtbot):
     webview.destroy()
 
 
+def test_publish_to_topic(qtbot):
+    webview = WebView(None, "testWebEngineView", True)
+    qtbot.addWidget(webview.get_web_engine_view())
+    assert not webview.publish("cpu", object()) # no subscriber, not even serialized
+    webview._web_bridge.js_subscribe("cpu")
+    assert webview.has_subscribers("cpu")
+    assert webview.publish("cpu", {"usage": 0.5})
+    webview.destroy()
+
+
+def test_new_page_cancels_calls(qtbot):
+    bridge = WebViewBridge(None)
+    bridge.js_connect_page("page-1")
+    context = CallContext("1", "query")
+    bridge._calls["1"] = context
+    bridge.js_subscribe("cpu")
+    bridge.js_connect_page("page-1") # the same page connecting again keeps its calls and topics
+    assert not context.cancelled and bridge.has_subscribers("cpu")
+    bridge.js_connect_page("page-2")
+    assert context.cancelled and "1" not in bridge._calls
+    assert not bridge.has_subscribers("cpu")
+
+
+def test_take_call_once(qtbot):
+    bridge = WebViewBridge(None)
+    context = CallContext("1", "query")
+    bridge._add_call(context)
+    with ThreadPoolExecutor(8) as pool: # replies race with each other and with js cancelling
+        taken = list(pool.map(lambda _: bridge._take_call(context), range(8)))
+    assert taken.count(True) == 1
+    bridge._add_call(context)
+    bridge.js_cancel("1")
+    assert not bridge._take_call(context)
+
+
+def test_unknown_executor_is_rejected(qtbot):
+    bridge = WebViewBridge(None)
+    with pytest.raises(ValueError):
+        bridge.bind_function("save", lambda doc_id: doc_id, executor="procss")
+    assert "save" not in bridge._dispatch_table
+
+
+def test_unhashable_serial_key_is_rejected(qtbot):
+    bridge = WebViewBridge(None)
+    bridge.bind_function("save", lambda doc_id: doc_id, serial_key="doc_id")
+    messages = []
+    bridge.on_message.connect(messages.append)
+    bridge.js_post_message_to_py("1", "save", '{"doc_id": [1, 2]}')
+    qtbot.waitUntil(lambda: any("InvalidParamsError" in message for message in messages))
+    assert "1" not in bridge._calls
+
+
+def test_cache_hits_and_rejects_need_no_worker_thread(qtbot):
+    bridge = WebViewBridge(None)
+    bridge.bind_function("add", lambda a, b: a + b, cache=True)
+    messages = []
+    bridge.on_message.connect(messages.append)
+    key = bridge._dispatch_table.get("add").cache.make_key((), {"a": 1, "b": 2})
+    bridge._dispatch_table.get("add").cache.put(key, 3)
+    with _busy_worker_threads(): # hits and rejects are answered anyway
+        bridge.js_post_message_to_py("1", "add", '{"a": 1, "b": 2}')
+        bridge.js_post_message_to_py("2", "add", '{"a": 1}')
+        assert len(messages) == 2
+    assert '"result":3' in messages[0] and "InvalidParamsError" in messages[1]
+
+
+def test_unknown_names_share_one_metrics_label(qtbot):
+    bridge = WebViewBridge(None)
+    bridge.bind_function("add", lambda a, b: a + b)
+    for i in range(3):
+        bridge.js_post_message_to_py(str(i), "random_%d" % i, "")
+    histogram = {"roundtrip": {"counts": [0] * (len(DEFAULT_BUCKETS_MS) + 1), "sum": 0, "max": 0}}
+    bridge.js_report_js_stats(json.dumps({"#1": histogram, "random": histogram}))
+    assert set(bridge.get_metrics().get_stats()) == {"<unknown>", "add"}
+    assert bridge.get_metrics().get_stats()["<unknown>"]["errors"] == 3
+
+
+def test_unencodable_result_gets_an_error_reply(qtbot):
+    bridge = WebViewBridge(None, "json")
+    bridge.bind_function("bad", lambda: object(), cache=True)
+    bridge.bind_function("good", lambda: 1)
+    messages = []
+    bridge.on_message.connect(messages.append)
+    bridge.js_post_message_to_py("1", "bad", "")
+    qtbot.waitUntil(lambda: len(messages) == 1)
+    assert json.loads(messages[0])["error"]["type"] == "RPCError" and "1" not in bridge._calls
+    assert len(bridge._dispatch_table.get("bad").cache) == 0 # not kept either
+    bridge.js_post_message_batch_to_py(json.dumps([{"callback_id": 2, "method": "bad"}, {"callback_id": 3, "method": "good"}]))
+    qtbot.waitUntil(lambda: len(messages) == 2)
+    replies = json.loads(messages[1])["batch"] # the other call of the batch still gets its result
+    assert replies[0]["error"]["type"] == "RPCError" and replies[1] == {"callback_id": "3", "result": 1}
+
+
+def test_batch(qtbot):
+    asyncqt_ui_thread_loop.start_loop()
+    bridge = WebViewBridge(None)
+    bridge.bind_function("add", lambda a, b: a + b)
+    bridge.bind_function("title", lambda: threading.current_thread() is threading.main_thread(), executor="ui")
+    messages = []
+    bridge.on_message.connect(messages.append)
+    bridge.js_post_message_batch_to_py("[") # not even a batch, nobody to answer
+    bridge.js_post_message_batch_to_py(json.dumps([
+        {"callback_id": 1, "method": "add", "params": {"a": 1, "b": 2}},
+        {"callback_id": 2, "method": "add", "params": {"a": 1}},
+        {"callback_id": 3},
+        {"method": "add"},
+        {"callback_id": 4, "method": "title"}
+    ]))
+    assert [reply["callback_id"] for reply in json.loads(messages[0])["batch"]] == ["3"] # the malformed entry, right away
+    qtbot.waitUntil(lambda: len(messages) == 3)
+    replies = {}
+    for message in messages[1:]:
+        message = json.loads(message)
+        for reply in message.get("batch", [message]):
+            replies[reply["callback_id"]] = reply
+    assert replies["1"]["result"] == 3 and replies["2"]["error"]["type"] == "InvalidParamsError"
+    assert replies["4"]["result"] is True
+    bridge.js_post_message_to_py("5", "title", "")
+    assert len(messages) == 3 # queued on the ui thread, not run inside the slot
+    qtbot.waitUntil(lambda: len(messages) == 4)
+    assert not bridge._calls
+
+
+def test_stream_rejects_plain_functions_without_calling_them(qtbot):
+    bridge = WebViewBridge(None)
+    called = []
+    bridge.bind_function("rows", lambda: called.append(1) or [1, 2])
+    async def fetch():
+        return 1
+    bridge.bind_function("fetch", fetch)
+    messages = []
+    bridge.on_message.connect(messages.append)
+    bridge.js_post_stream_to_py("1", "rows", "")
+    bridge.js_post_stream_to_py("2", "fetch", "") # no coroutine is left behind, never awaited
+    assert not called and not bridge._streams
+    assert [(json.loads(message)["stream"], json.loads(message)["error"]["type"]) for message in messages] == [("error", "RPCError")] * 2
+
+
+def test_stream_chunks_reach_js(qtbot):
+    bridge = WebViewBridge(None)
+    def rows(n):
+        yield from range(n)
+    async def async_rows(n):
+        for i in range(n):
+            yield i
+    bridge.bind_function("rows", rows)
+    bridge.bind_function("async_rows", async_rows)
+    messages = []
+    bridge.on_message.connect(lambda message: messages.append(json.loads(message)))
+    bridge.js_post_stream_to_py("1", "rows", '{"n": 2}')
+    bridge.js_post_stream_to_py("2", "async_rows", '{"n": 2}')
+    qtbot.waitUntil(lambda: len(messages) == 6)
+    for stream_id in ("1", "2"):
+        chunks = [message for message in messages if message["callback_id"] == stream_id]
+        assert [(chunk["stream"], chunk.get("result")) for chunk in chunks] == [("data", 0), ("data", 1), ("end", None)]
+    qtbot.waitUntil(lambda: not bridge._streams)
+
+
+def test_process_executor_reply(qtbot):
+    bridge = WebViewBridge(None)
+    bridge.bind_function("factorial", math.factorial, executor="process")
+    messages = []
+    bridge.on_message.connect(lambda message: messages.append(json.loads(message)))
+    try:
+        bridge.js_post_message_to_py("1", "factorial", "[5]")
+        bridge.js_post_message_to_py("2", "factorial", "[-1]") # raises in the worker process
+        qtbot.waitUntil(lambda: len(messages) == 2, timeout=60 * 1000)
+    finally:
+        asyncqt_process_executor.shutdown()
+    replies = {message["callback_id"]: message for message in messages}
+    assert replies["1"]["result"] == 120 and replies["2"]["error"]["type"] == "ValueError"
+    assert not bridge._calls
+
+
+def test_sync_invoke_rejects_coroutine_function(qtbot):
+    bridge = WebViewBridge(None)
+    async def fetch():
+        return 1
+    bridge.bind_function("fetch", fetch)
+    reply = bridge.invoke("fetch", "") # rejected, the ui thread never waits on the event loop
+    assert reply["error"]["type"] == "RPCError"
+
+
+def test_sync_invoke_replies_result_or_error(qtbot):
+    bridge = WebViewBridge(None)
+    bridge.bind_function("add", lambda a, b: a + b)
+    bridge.bind_function("fail", lambda: 1 / 0)
+    assert bridge.invoke("add", json.dumps({"a": 1, "b": 2})) == {"result": 3}
+    assert bridge.invoke("fail", "")["error"]["type"] == "ZeroDivisionError"
+    assert bridge.invoke("missing", "")["error"]["type"] == "FunctionNotFoundError"
+    assert bridge.invoke("add", json.dumps({"a": 1}))["error"]["type"] == "InvalidParamsError"
+
+
 def test_show_alert_dialog(qtbot):
     win = BrowserWindow({})
     win.show()